@@ -0,0 +1,2 @@
+# Shared helpers for the Python API endpoints. The leading underscore keeps
+# Vercel from deploying this directory as a serverless function.
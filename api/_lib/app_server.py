@@ -0,0 +1,245 @@
+"""Single-process asyncio HTTP server that mounts every Python endpoint.
+
+Connections are handled on the event loop; the route functions themselves
+are blocking (they call the synchronous OpenAI client), so each request runs
+on a worker thread and many model calls can be in flight at once.
+
+    python api/_lib/app_server.py --port 8000
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from http.client import parse_headers
+from http.server import BaseHTTPRequestHandler
+import argparse
+import asyncio
+import html
+import importlib
+import inspect
+import io
+import logging
+from urllib.parse import parse_qs
+
+from _lib import metrics
+from _lib.handlers import CORS_HEADERS, EventStream, HTTPError, decode_json, format_event, read_body_async
+from _lib.payloads import dumps
+
+logger = logging.getLogger(__name__)
+
+# Path -> "module:function"; modules are imported on first use so a broken
+# endpoint does not take the others down with it.
+ROUTES = {
+    '/api/calculate_scores': 'calculate_scores.index:score_application',
+    '/api/create_application': 'create_application.index:create_application',
+    '/api/submit_application': 'submit_application.index_dep:submit_application',
+    '/api/review_application': 'submit_application.local_server:review_application',
+    '/api/search_examples': '_lib.examples:search_examples',
+    '/api/embeddings': '_lib.embeddings:create_embeddings',
+}
+
+# GET routes take the parsed query string and return (status, payload); a
+# str payload is sent as text/plain. A route defined with async def runs on
+# the event loop instead of a worker thread, for long polls that mostly wait.
+GET_ROUTES = {
+    '/api/openai_pool': '_lib.openai_client:pool_stats_route',
+    '/api/jobs': '_lib.jobs:job_status_route',
+    '/api/model_router': '_lib.model_router:router_stats_route',
+    '/metrics': '_lib.metrics:metrics_route',
+}
+
+APP_SERVER_WORKERS = int(os.environ.get('APP_SERVER_WORKERS', '64'))
+MAX_HEADER_BYTES = 64 * 1024
+
+_STREAM_END = object()
+
+
+def error_body(status, message):
+    # Same page BaseHTTPRequestHandler.send_error produces, so clients that
+    # read the error text see what they always have.
+    explain = BaseHTTPRequestHandler.responses.get(status, ('', ''))[1]
+    content = BaseHTTPRequestHandler.error_message_format % {
+        'code': status,
+        'message': html.escape(message, quote=False),
+        'explain': html.escape(explain, quote=False),
+    }
+    return content.encode('utf-8', 'replace')
+
+
+class AppServer:
+    def __init__(self, routes=None, get_routes=None, max_workers=APP_SERVER_WORKERS):
+        self.routes = {
+            'POST': dict(ROUTES if routes is None else routes),
+            'GET': dict(GET_ROUTES if get_routes is None else get_routes),
+        }
+        self._resolved = {}
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='app-server')
+
+    def resolve(self, method, path):
+        if (method, path) not in self._resolved:
+            target = self.routes.get(method, {}).get(path.rstrip('/') or '/')
+            if target is None:
+                return None
+            module_name, function_name = target.split(':')
+            self._resolved[(method, path)] = getattr(importlib.import_module(module_name), function_name)
+        return self._resolved[(method, path)]
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while await self.handle_request(reader, writer):
+                pass
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception:
+            logger.exception("Unhandled error in app server connection")
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def handle_request(self, reader, writer):
+        """Serve one request; returns True if the connection stays open."""
+        try:
+            head = await reader.readuntil(b'\r\n\r\n')
+        except asyncio.IncompleteReadError:
+            return False
+        except asyncio.LimitOverrunError:
+            await self.send_error(writer, 431, "Request header fields too large", keep_alive=False)
+            return False
+
+        request_line, _, header_block = head.partition(b'\r\n')
+        try:
+            method, target, version = request_line.decode('latin-1').split()
+        except ValueError:
+            await self.send_error(writer, 400, "Bad request syntax", keep_alive=False)
+            return False
+        headers = parse_headers(io.BytesIO(header_block))
+        keep_alive = version == 'HTTP/1.1' and headers.get('Connection', '').lower() != 'close'
+
+        try:
+            body = await read_body_async(reader, headers)
+        except HTTPError as e:
+            # The rest of an oversized body is never read, so the connection
+            # cannot be reused.
+            await self.send_error(writer, e.status, e.message, keep_alive=False)
+            return False
+
+        if method == 'OPTIONS':
+            await self.send_response(writer, 200, b'', keep_alive=keep_alive)
+            return keep_alive
+
+        if method not in self.routes:
+            await self.send_error(writer, 501, f"Unsupported method ({method!r})", keep_alive)
+            return keep_alive
+        path, _, query = target.partition('?')
+        try:
+            route = self.resolve(method, path)
+        except Exception as e:
+            logger.exception(f"Could not load route for {target}")
+            await self.send_error(writer, 500, str(e), keep_alive)
+            return keep_alive
+        if route is None:
+            await self.send_error(writer, 404, "Not Found", keep_alive)
+            return keep_alive
+
+        endpoint = path.rstrip('/') or '/'
+        if method == 'GET':
+            args = (parse_qs(query),)
+        else:
+            try:
+                with metrics.timed('request_stage_seconds', endpoint=endpoint, stage='parse'):
+                    args = (decode_json(body), headers)
+            except HTTPError as e:
+                await self.send_error(writer, e.status, e.message, keep_alive)
+                return keep_alive
+
+        loop = asyncio.get_running_loop()
+        try:
+            with metrics.timed('request_stage_seconds', endpoint=endpoint, stage='handler'):
+                if inspect.iscoroutinefunction(route):
+                    result = await route(*args)
+                else:
+                    result = await loop.run_in_executor(self.executor, route, *args)
+        except HTTPError as e:
+            if e.json_body:
+                await self.send_json(writer, e.status, {"error": e.message}, keep_alive)
+            else:
+                await self.send_error(writer, e.status, e.message, keep_alive)
+            return keep_alive
+        except Exception as e:
+            logger.exception(f"Unexpected error serving {target}")
+            await self.send_error(writer, 500, str(e), keep_alive)
+            return keep_alive
+
+        if isinstance(result, EventStream):
+            with metrics.timed('request_stage_seconds', endpoint=endpoint, stage='stream'):
+                await self.send_event_stream(writer, result)
+            return False
+
+        status, payload = result
+        with metrics.timed('request_stage_seconds', endpoint=endpoint, stage='write'):
+            if isinstance(payload, str):
+                await self.send_response(writer, status, payload.encode('utf-8'), 'text/plain; version=0.0.4', keep_alive)
+            else:
+                await self.send_json(writer, status, payload, keep_alive)
+        return keep_alive
+
+    async def send_response(self, writer, status, body, content_type=None, keep_alive=True, length=True, extra_headers=()):
+        lines = [f'HTTP/1.1 {status} {HTTPStatus(status).phrase}']
+        lines.extend(f'{name}: {value}' for name, value in CORS_HEADERS)
+        if content_type:
+            lines.append(f'Content-Type: {content_type}')
+        if length:
+            lines.append(f'Content-Length: {len(body)}')
+        lines.extend(f'{name}: {value}' for name, value in extra_headers)
+        lines.append('Connection: keep-alive' if keep_alive else 'Connection: close')
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+        await writer.drain()
+
+    async def send_json(self, writer, status, payload, keep_alive=True):
+        await self.send_response(writer, status, dumps(payload), 'application/json', keep_alive)
+
+    async def send_error(self, writer, status, message, keep_alive=True):
+        await self.send_response(writer, status, error_body(status, message), BaseHTTPRequestHandler.error_content_type, keep_alive)
+
+    async def send_event_stream(self, writer, stream):
+        await self.send_response(
+            writer, 200, b'', 'text/event-stream', keep_alive=False, length=False,
+            extra_headers=(('Cache-Control', 'no-cache'), ('X-Accel-Buffering', 'no')),
+        )
+        loop = asyncio.get_running_loop()
+        events = iter(stream.events)
+        while True:
+            item = await loop.run_in_executor(self.executor, next, events, _STREAM_END)
+            if item is _STREAM_END:
+                break
+            payload, event = item
+            writer.write(format_event(payload, event))
+            await writer.drain()
+
+    async def serve(self, host='', port=8000):
+        # Routes load lazily, but a broken prompt template should stop the
+        # server here rather than fail requests later.
+        importlib.import_module('_lib.prompt_templates')
+        server = await asyncio.start_server(self.handle_connection, host or None, port, limit=MAX_HEADER_BYTES)
+        print(f'Starting app server on port {port}')
+        async with server:
+            await server.serve_forever()
+
+
+def serve(host='', port=8000, routes=None):
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(AppServer(routes).serve(host, port))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve all Python API endpoints from one process.")
+    parser.add_argument('--host', default='')
+    parser.add_argument('--port', type=int, default=8000)
+    args = parser.parse_args()
+    serve(args.host, args.port)
@@ -0,0 +1,220 @@
+"""Score a whole cohort of applications from a JSONL file.
+
+    python api/_lib/batch_scoring.py cohort.jsonl scores.jsonl --concurrency 8
+
+Each input line is either a calculate_scores request body or a chat-format
+record like goodwin_jsonl.jsonl, whose user message is split into its work
+experience, education and open-text sections. Results are appended to the
+output file as each application finishes, in the calculate_scores response
+shape plus an "id". Rerunning with the same output file skips applications
+that already scored, so a crashed run resumes where it stopped; failed rows
+are retried and the last row for an id wins.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from _lib.corpus import read_jsonl, record_messages, split_application
+from _lib.scoring import SECTIONS, ScoreRequest, calculate_score, collect_errors
+from _lib.weights import weighted_score, weights_for
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """Token bucket over model calls, with a shared pause after a 429."""
+
+    def __init__(self, requests_per_minute):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute else 0
+        self._next_slot = 0.0
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot, self._paused_until)
+            self._next_slot = slot + self.interval
+        delay = slot - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def pause(self, seconds):
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+def is_rate_limited(result):
+    error = result.get('error', '')
+    return '429' in error or 'rate limit' in error.lower()
+
+
+def drop_partial_row(output_path):
+    """Cut off a last row left half-written by a killed run.
+
+    Rows are written whole with their newline, so anything after the last
+    newline is a partial row; the resumed run re-scores it.
+    """
+    with open(output_path, 'rb') as file:
+        data = file.read()
+    end = data.rfind(b'\n') + 1
+    if end < len(data):
+        logger.warning(f"Dropping a partial last row ({len(data) - end} bytes) from {output_path}")
+        with open(output_path, 'r+b') as file:
+            file.truncate(end)
+
+
+def load_completed(output_path):
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+    drop_partial_row(output_path)
+    for _, row in read_jsonl(output_path):
+        if 'error' in row:
+            completed.discard(row['id'])
+        else:
+            completed.add(row['id'])
+    return completed
+
+
+def build_score_request(record, model, prompts):
+    data = {}
+    for section in SECTIONS:
+        data[f'{section.key}_model'] = model
+        data[f'{section.key}_prompt'] = prompts.get(section.key, '')
+
+    user_messages = record_messages(record, 'user')
+    if user_messages:
+        sections = split_application(user_messages[0])
+        for section in SECTIONS:
+            data[f'{section.key}_content'] = sections.get(section.key, '')
+    data.update({key: value for key, value in record.items() if key != 'messages' and value})
+    return ScoreRequest(data)
+
+
+class BatchScorer:
+    def __init__(self, output, concurrency=8, requests_per_minute=0, max_retries=5, profile=None):
+        self.output = output
+        self.profile = profile
+        self.max_retries = max_retries
+        self.limiter = RateLimiter(requests_per_minute)
+        self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='batch-scoring')
+        # At most `concurrency` applications in flight, so a large input file
+        # is streamed rather than queued up front.
+        self.in_flight = threading.BoundedSemaphore(concurrency)
+        self.write_lock = threading.Lock()
+        self.scored = 0
+        self.failed = 0
+
+    def score_section(self, section, score_request):
+        content, model, prompt = score_request.section_inputs(section.key)
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            result = calculate_score(content, model, prompt, section.role_description, section.temperature)
+            if not is_rate_limited(result) or attempt == self.max_retries:
+                return result
+            backoff = min(60, 2 ** attempt) + random.uniform(0, 1)
+            logger.warning(f"Rate limited scoring {section.key}, backing off {backoff:.1f}s")
+            self.limiter.pause(backoff)
+
+    def submit(self, record_id, score_request, firm=None):
+        self.in_flight.acquire()
+        results = {}
+        remaining = [len(SECTIONS)]
+        lock = threading.Lock()
+
+        def section_done(section, future):
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {"error": f"Error calculating score: {str(e)}"}
+            with lock:
+                results[section.key] = result
+                remaining[0] -= 1
+                finished = remaining[0] == 0
+            if not finished:
+                return
+            # Exceptions in done-callbacks are swallowed by concurrent.futures,
+            # so a failed write must still free the slot or submit() hangs.
+            try:
+                self.write(record_id, results, firm)
+            except Exception:
+                logger.exception(f"Could not write scores for {record_id}")
+                with self.write_lock:
+                    self.failed += 1
+            finally:
+                self.in_flight.release()
+
+        for section in SECTIONS:
+            future = self.executor.submit(self.score_section, section, score_request)
+            future.add_done_callback(lambda f, section=section: section_done(section, f))
+
+    def write(self, record_id, results, firm=None):
+        row = {"id": record_id, **{key: results[key] for key in ('workexp', 'education', 'opentext')}}
+        errors = collect_errors(results)
+        if errors:
+            row["error"] = '; '.join(errors)
+        else:
+            row["weighted_score"] = weighted_score(results, weights_for(self.profile or firm))
+        with self.write_lock:
+            self.output.write(json.dumps(row) + '\n')
+            self.output.flush()
+            if errors:
+                self.failed += 1
+            else:
+                self.scored += 1
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+
+def run(input_path, output_path, model, prompts, concurrency, requests_per_minute, max_retries, profile=None):
+    completed = load_completed(output_path)
+    skipped = 0
+    started = time.monotonic()
+    with open(output_path, 'a', encoding='utf-8') as output:
+        scorer = BatchScorer(output, concurrency, requests_per_minute, max_retries, profile)
+        try:
+            for line_number, record in read_jsonl(input_path):
+                record_id = str(record.get('id', line_number))
+                if record_id in completed:
+                    skipped += 1
+                    continue
+                scorer.submit(record_id, build_score_request(record, model, prompts), record.get('firm_id') or record.get('firm'))
+        finally:
+            scorer.close()
+    elapsed = time.monotonic() - started
+    print(f"Scored {scorer.scored}, failed {scorer.failed}, skipped {skipped} already scored in {elapsed:.1f}s")
+    return scorer.failed == 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score a JSONL cohort of applications.")
+    parser.add_argument('input')
+    parser.add_argument('output')
+    parser.add_argument('--model', default='gpt-4o-mini', help="Model for records that do not name one")
+    parser.add_argument('--workexp-prompt', default='')
+    parser.add_argument('--education-prompt', default='')
+    parser.add_argument('--opentext-prompt', default='')
+    parser.add_argument('--concurrency', type=int, default=8, help="Maximum model calls in flight")
+    parser.add_argument('--requests-per-minute', type=int, default=0, help="0 disables the limiter")
+    parser.add_argument('--max-retries', type=int, default=5, help="Retries per section after a 429")
+    parser.add_argument('--profile', help="Weight profile for every row; defaults to each row's firm")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    prompts = {'workexp': args.workexp_prompt, 'education': args.education_prompt, 'opentext': args.opentext_prompt}
+    ok = run(args.input, args.output, args.model, prompts, args.concurrency, args.requests_per_minute, args.max_retries, args.profile)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,57 @@
+import json
+import re
+
+# Headings used in the user message of the fine-tuning corpora
+# (goodwin_jsonl.jsonl, josh.jsonl) and in submit_application's user prompt.
+_HEADING = re.compile(r'^(Application decision|Open-Text Question|Open-Text Answer|Work Experience|Education):[ \t]*$', re.M)
+
+_SECTION_KEYS = {
+    'Application decision': 'decision',
+    'Open-Text Question': 'opentext',
+    'Open-Text Answer': 'opentext',
+    'Work Experience': 'workexp',
+    'Education': 'education',
+}
+
+
+def read_jsonl(path):
+    """Yield (line number, record) for every non-blank line of a JSONL file.
+
+    The corpora in the repo root end each line with a trailing comma, so that
+    is tolerated rather than treated as a parse error.
+    """
+    with open(path, 'r', encoding='utf-8') as file:
+        for line_number, line in enumerate(file, start=1):
+            line = line.strip().rstrip(',')
+            if line:
+                yield line_number, json.loads(line)
+
+
+def split_application(text):
+    """Split an application into {section key: text} using its headings."""
+    sections = {}
+    matches = list(_HEADING.finditer(text))
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        sections[_SECTION_KEYS[match.group(1)]] = text[match.end():end].strip()
+    return sections
+
+
+def open_text_question(text):
+    """The question of an application with separate Open-Text Question/Answer sections.
+
+    The corpora put the answer itself under "Open-Text Question:" and never
+    give the question, so for them this is ''.
+    """
+    matches = list(_HEADING.finditer(text))
+    if not any(match.group(1) == 'Open-Text Answer' for match in matches):
+        return ''
+    for i, match in enumerate(matches):
+        if match.group(1) == 'Open-Text Question':
+            end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+            return text[match.end():end].strip()
+    return ''
+
+
+def record_messages(record, role):
+    return [message['content'] for message in record.get('messages', []) if message.get('role') == role]
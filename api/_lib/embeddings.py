@@ -0,0 +1,189 @@
+"""Embedding service with a persistent cache and request micro-batching.
+
+Embeddings are cached in SQLite under a sha256 of (model, text), so
+byte-identical text is never embedded twice; the cache is capped and evicts
+least recently used rows. Cache misses are queued for a few milliseconds and
+sent to the API together, many inputs per call, so concurrent requests and
+bulk jobs share round-trips.
+"""
+from concurrent.futures import Future
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from _lib.handlers import HTTPError
+from _lib.openai_client import create_embeddings as request_embeddings
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL = 'text-embedding-3-small'
+
+# Unset keeps the cache in memory for the life of the process.
+EMBEDDING_CACHE_PATH = os.environ.get('EMBEDDING_CACHE_PATH', ':memory:')
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.environ.get('EMBEDDING_CACHE_MAX_ENTRIES', '50000'))
+EMBEDDING_BATCH_WINDOW_MS = float(os.environ.get('EMBEDDING_BATCH_WINDOW_MS', '10'))
+EMBEDDING_BATCH_MAX = int(os.environ.get('EMBEDDING_BATCH_MAX', '256'))
+# How long embed_texts waits for the batcher before giving up; covers the
+# batch window plus the API call and its retries.
+EMBEDDING_TIMEOUT_SECONDS = float(os.environ.get('EMBEDDING_TIMEOUT_SECONDS', '120'))
+
+
+def embedding_key(model, text):
+    return hashlib.sha256(f'{model}\0{text}'.encode('utf-8')).hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(self, path=':memory:', max_entries=50000):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)')
+        self._db.commit()
+
+    def get_many(self, keys):
+        if not keys:
+            return {}
+        now = time.time()
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                for key, vector in self._db.execute(f'SELECT key, vector FROM embeddings WHERE key IN ({placeholders})', chunk):
+                    found[key] = np.frombuffer(vector, dtype=np.float32)
+            if found:
+                self._db.executemany('UPDATE embeddings SET last_used = ? WHERE key = ?', [(now, key) for key in found])
+                self._db.commit()
+        return found
+
+    def put_many(self, items):
+        now = time.time()
+        with self._lock:
+            self._db.executemany(
+                'INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)',
+                [(key, np.asarray(vector, dtype=np.float32).tobytes(), now) for key, vector in items],
+            )
+            excess = self._db.execute('SELECT COUNT(*) FROM embeddings').fetchone()[0] - self.max_entries
+            if excess > 0:
+                self._db.execute(
+                    'DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)', (excess,)
+                )
+            self._db.commit()
+
+
+class EmbeddingBatcher:
+    """Coalesces embed calls that arrive within window_ms into one request."""
+
+    def __init__(self, window_ms=10, max_batch=256):
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._pending = []
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name='embedding-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, model, text):
+        future = Future()
+        with self._condition:
+            self._pending.append((model, text, future))
+            self._condition.notify()
+        return future
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+                deadline = time.monotonic() + self.window
+                while len(self._pending) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+
+            by_model = {}
+            for item in batch:
+                by_model.setdefault(item[0], []).append(item)
+            for model, items in by_model.items():
+                self._send(model, items)
+
+    def _send(self, model, items):
+        try:
+            response = request_embeddings(model=model, input=[text for _, text, _ in items])
+            for item in response.data:
+                items[item.index][2].set_result(np.asarray(item.embedding, dtype=np.float32))
+            missing = sum(1 for _, _, future in items if not future.done())
+            if missing:
+                raise RuntimeError(f"Embedding response is missing {missing} of {len(items)} inputs")
+        except Exception as e:
+            logger.error(f"Error creating embeddings: {str(e)}")
+            for _, _, future in items:
+                if not future.done():
+                    future.set_exception(e)
+
+
+embedding_cache = EmbeddingCache(EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_ENTRIES)
+_batcher = None
+_batcher_lock = threading.Lock()
+
+
+def _get_batcher():
+    global _batcher
+    with _batcher_lock:
+        if _batcher is None:
+            _batcher = EmbeddingBatcher(EMBEDDING_BATCH_WINDOW_MS, EMBEDDING_BATCH_MAX)
+        return _batcher
+
+
+def embed_texts(texts, model=EMBEDDING_MODEL, stats=None):
+    """Return one float32 vector per text, in order.
+
+    If a stats dict is passed, its "hits" and "misses" are incremented.
+    """
+    texts = list(texts)
+    keys = [embedding_key(model, text) for text in texts]
+    vectors = embedding_cache.get_many(list(set(keys)))
+
+    futures = {}
+    for key, text in zip(keys, texts):
+        if key not in vectors and key not in futures:
+            futures[key] = _get_batcher().submit(model, text)
+    if futures:
+        deadline = time.monotonic() + EMBEDDING_TIMEOUT_SECONDS
+        fresh = {key: future.result(timeout=max(0, deadline - time.monotonic())) for key, future in futures.items()}
+        embedding_cache.put_many(fresh.items())
+        vectors.update(fresh)
+
+    if stats is not None:
+        stats['hits'] = stats.get('hits', 0) + len(texts) - len(futures)
+        stats['misses'] = stats.get('misses', 0) + len(futures)
+    return [vectors[key] for key in keys]
+
+
+def create_embeddings(data, headers=None):
+    texts = data.get('input')
+    if isinstance(texts, str):
+        texts = [texts]
+    if not texts or not all(isinstance(text, str) and text for text in texts):
+        raise HTTPError(400, 'input must be a non-empty string or list of strings', json_body=True)
+    model = data.get('model') or EMBEDDING_MODEL
+    stats = {}
+    try:
+        vectors = embed_texts(texts, model, stats)
+    except Exception as e:
+        raise HTTPError(500, f"Error creating embeddings: {str(e)}", json_body=True)
+    return 200, {
+        "model": model,
+        "data": [{"index": i, "embedding": vector.tolist()} for i, vector in enumerate(vectors)],
+        "cache": stats,
+    }
@@ -0,0 +1,105 @@
+"""In-process few-shot example retrieval for the review and draft endpoints."""
+import logging
+import os
+import threading
+
+from _lib.handlers import HTTPError
+
+logger = logging.getLogger(__name__)
+
+# Prefix of the .npy/.json pair written by `vector_index.py build`. Retrieval
+# is off when it is unset.
+EXAMPLE_INDEX_PATH = os.environ.get('EXAMPLE_INDEX_PATH')
+
+# "ivf" switches to approximate search; needs the .ivf.npz written by
+# `vector_index.py build --ann-lists N`.
+EXAMPLE_INDEX_ANN = os.environ.get('EXAMPLE_INDEX_ANN', '')
+EXAMPLE_INDEX_NPROBE = int(os.environ.get('EXAMPLE_INDEX_NPROBE', '8'))
+
+# Same placeholder the frontend's prompt helpers fill from /api/search_examples
+# before submitting a review. Prompts that still have it when they reach the
+# Python endpoints (drafts, direct review_application calls) are filled here.
+EXAMPLES_PLACEHOLDER = '{&top_examples_retrieval&}'
+
+# What the placeholder becomes server-side. The examples themselves follow
+# the system prompt in their own message, so the system prompt stays the same
+# bytes on every request and its prefix can be cached by the provider.
+EXAMPLES_REFERENCE = 'the similar applications provided in the next message'
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    global _index
+    if _index is None and EXAMPLE_INDEX_PATH:
+        with _index_lock:
+            if _index is None:
+                if EXAMPLE_INDEX_ANN == 'ivf':
+                    from _lib.ivf_index import IVFIndex
+                    _index = IVFIndex.load(EXAMPLE_INDEX_PATH, nprobe=EXAMPLE_INDEX_NPROBE)
+                else:
+                    from _lib.vector_index import VectorIndex
+                    _index = VectorIndex.load(EXAMPLE_INDEX_PATH)
+                logger.info(f"Loaded {len(_index)} examples from {EXAMPLE_INDEX_PATH}")
+    return _index
+
+
+def top_examples(text, k=10):
+    """Return [{"id", "question", "application_text", "similarity"}] like /api/search_examples."""
+    from _lib.embeddings import embed_texts
+
+    index = get_index()
+    if index is None:
+        return []
+    [query] = embed_texts([text])
+    return [
+        {
+            "id": example_id,
+            "question": metadata.get('question', ''),
+            "application_text": metadata.get('application_text', ''),
+            "similarity": similarity,
+        }
+        for example_id, similarity, metadata in index.search(query, k)
+    ]
+
+
+def split_top_examples(prompt, text, k=10):
+    """Return (prompt, examples text) for a system prompt with the placeholder.
+
+    The placeholder is replaced by a fixed reference to the examples rather
+    than by the examples, which the caller sends after the prompt. Without an
+    index, or when retrieval fails or finds nothing, the placeholder
+    is dropped, as the frontend does.
+    """
+    if EXAMPLES_PLACEHOLDER not in prompt:
+        return prompt, ''
+    examples = []
+    if get_index() is not None:
+        try:
+            examples = top_examples(text, k)
+        except Exception as e:
+            logger.error(f"Error retrieving examples: {str(e)}")
+    if not examples:
+        return prompt.replace(EXAMPLES_PLACEHOLDER, ''), ''
+    # Indexes built from the repo corpora have no question text; their
+    # examples are just the answer.
+    examples_text = '\n\n'.join(
+        f"Question: {example['question']}\nAnswer: {example['application_text']}" if example.get('question')
+        else f"Answer: {example['application_text']}"
+        for example in examples
+    )
+    return prompt.replace(EXAMPLES_PLACEHOLDER, EXAMPLES_REFERENCE), examples_text
+
+
+def search_examples(data, headers=None):
+    user_application = data.get('user_application')
+    if not user_application:
+        raise HTTPError(400, 'user_application is required', json_body=True)
+    if get_index() is None:
+        raise HTTPError(503, 'Example index is not configured (set EXAMPLE_INDEX_PATH)', json_body=True)
+    try:
+        return 200, top_examples(user_application)
+    except Exception as e:
+        logger.error(f"Error searching examples: {str(e)}")
+        raise HTTPError(500, 'An error occurred while processing your request', json_body=True)
@@ -0,0 +1,197 @@
+from http.server import BaseHTTPRequestHandler
+import os
+
+from _lib import metrics
+from _lib.payloads import dumps, loads
+
+# One CORS policy for every Python endpoint, served both by the Vercel
+# handlers below and by the shared app server.
+CORS_HEADERS = (
+    ('Access-Control-Allow-Credentials', 'true'),
+    ('Access-Control-Allow-Origin', '*'),
+    ('Access-Control-Allow-Methods', 'GET,OPTIONS,PATCH,DELETE,POST,PUT'),
+    ('Access-Control-Allow-Headers', 'X-CSRF-Token, X-Requested-With, Accept, Accept-Version, Content-Length, Content-MD5, Content-Type, Date, X-Api-Version, Authorization'),
+)
+
+# Larger bodies are refused with 413; imported drafts are the biggest field.
+MAX_BODY_BYTES = int(os.environ.get('MAX_BODY_BYTES', str(1024 * 1024)))
+MAX_CHUNK_LINE_BYTES = 1024
+
+
+class HTTPError(Exception):
+    """Raised by a route to end the request with an error status.
+
+    json_body=True sends {"error": message} as JSON; otherwise the response
+    matches BaseHTTPRequestHandler.send_error, which is what the scoring and
+    review endpoints have always returned.
+    """
+
+    def __init__(self, status, message, json_body=False):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.json_body = json_body
+
+
+class EventStream:
+    """A route result that is sent as Server-Sent Events.
+
+    events yields (payload, event name or None) pairs; nothing is pulled from
+    it until the response headers have been written.
+    """
+
+    def __init__(self, events):
+        self.events = events
+
+
+def format_event(payload, event=None):
+    message = b"data: " + dumps(payload) + b"\n\n"
+    if event:
+        message = f"event: {event}\n".encode('utf-8') + message
+    return message
+
+
+def _too_large(limit):
+    return HTTPError(413, f"Request body is larger than {limit} bytes")
+
+
+def _read_steps(headers, limit):
+    """Parse a request body from its framing headers, independent of the I/O used.
+
+    A generator that yields what it needs next (an int for exactly that many
+    bytes, None for one line) and is sent the bytes; its return value is the
+    body. read_body and read_body_async drive it over blocking and asyncio
+    streams respectively.
+    """
+    if 'chunked' in headers.get('Transfer-Encoding', '').lower():
+        body = bytearray()
+        while True:
+            line = yield None
+            try:
+                size = int(line.split(b';', 1)[0].strip(), 16)
+            except ValueError:
+                raise HTTPError(400, "Malformed chunked request body")
+            if size == 0:
+                while (yield None).strip():
+                    pass
+                return bytes(body)
+            if len(body) + size > limit:
+                raise _too_large(limit)
+            body += yield size
+            yield 2
+
+    try:
+        length = int(headers.get('Content-Length') or 0)
+    except ValueError:
+        raise HTTPError(400, "Invalid Content-Length")
+    if length > limit:
+        raise _too_large(limit)
+    return (yield length) if length > 0 else b''
+
+
+def read_body(rfile, headers, limit=None):
+    if limit is None:
+        limit = MAX_BODY_BYTES
+    steps = _read_steps(headers, limit)
+    try:
+        request = next(steps)
+        while True:
+            if request is None:
+                data = rfile.readline(MAX_CHUNK_LINE_BYTES)
+            else:
+                data = rfile.read(request)
+                if len(data) < request:
+                    raise HTTPError(400, "Request body ended early")
+            request = steps.send(data)
+    except StopIteration as done:
+        return done.value
+
+
+async def read_body_async(reader, headers, limit=None):
+    if limit is None:
+        limit = MAX_BODY_BYTES
+    steps = _read_steps(headers, limit)
+    try:
+        request = next(steps)
+        while True:
+            data = await (reader.readline() if request is None else reader.readexactly(request))
+            request = steps.send(data)
+    except StopIteration as done:
+        return done.value
+
+
+def decode_json(body):
+    try:
+        return loads(body)
+    except ValueError:
+        raise HTTPError(400, "Request body is not valid JSON")
+
+
+class JSONRequestHandler(BaseHTTPRequestHandler):
+    """BaseHTTPRequestHandler that delegates POST bodies to a route function.
+
+    Subclasses set route = staticmethod(fn), where fn(data, headers) returns
+    (status, payload) or an EventStream, or raises HTTPError.
+    """
+
+    route = None
+
+    def set_CORS_headers(self):
+        for name, value in CORS_HEADERS:
+            self.send_header(name, value)
+
+    def do_OPTIONS(self):
+        self.send_response(200)
+        self.set_CORS_headers()
+        self.end_headers()
+
+    def do_POST(self):
+        endpoint = self.path.partition('?')[0]
+        try:
+            with metrics.timed('request_stage_seconds', endpoint=endpoint, stage='parse'):
+                data = decode_json(read_body(self.rfile, self.headers))
+        except HTTPError as e:
+            # Whatever is left of the body is still on the socket.
+            self.close_connection = True
+            self.send_http_error(e)
+            return
+
+        try:
+            with metrics.timed('request_stage_seconds', endpoint=endpoint, stage='handler'):
+                result = self.route(data, self.headers)
+        except HTTPError as e:
+            self.send_http_error(e)
+            return
+
+        if isinstance(result, EventStream):
+            with metrics.timed('request_stage_seconds', endpoint=endpoint, stage='stream'):
+                self.send_event_stream(result)
+        else:
+            status, payload = result
+            with metrics.timed('request_stage_seconds', endpoint=endpoint, stage='write'):
+                self.send_json(status, payload)
+
+    def send_http_error(self, error):
+        if error.json_body:
+            self.send_json(error.status, {"error": error.message})
+        else:
+            self.send_error(error.status, error.message)
+
+    def send_json(self, status, payload):
+        self.send_response(status)
+        self.set_CORS_headers()
+        self.send_header('Content-type', 'application/json')
+        self.end_headers()
+        self.wfile.write(dumps(payload))
+
+    def send_event_stream(self, stream):
+        self.send_response(200)
+        self.set_CORS_headers()
+        self.send_header('Content-type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('X-Accel-Buffering', 'no')
+        self.end_headers()
+        self.wfile.flush()
+        for payload, event in stream.events:
+            self.wfile.write(format_event(payload, event))
+            self.wfile.flush()
@@ -0,0 +1,106 @@
+"""Approximate top-k search with an inverted-file (IVF-flat) index.
+
+Rows are clustered with spherical k-means; a query scores the centroids,
+probes the nprobe best lists and runs the exact dot product only over their
+rows. search() has the same signature and result shape as
+VectorIndex.search, so callers can switch between exact and approximate
+retrieval without changes.
+"""
+import numpy as np
+
+from _lib.vector_index import VectorIndex
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+
+def spherical_kmeans(vectors, n_lists, n_iter=20, seed=0):
+    rng = np.random.default_rng(seed)
+    data = _normalize(np.asarray(vectors, dtype=np.float32))
+    centroids = data[rng.choice(len(data), size=n_lists, replace=False)].copy()
+    assignments = None
+    for _ in range(n_iter):
+        new_assignments = np.argmax(data @ centroids.T, axis=1)
+        if assignments is not None and np.array_equal(new_assignments, assignments):
+            break
+        assignments = new_assignments
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, data)
+        empty = ~sums.any(axis=1)
+        # Reseed empty lists from random rows so every list stays in use.
+        sums[empty] = data[rng.choice(len(data), size=int(empty.sum()), replace=False)]
+        centroids = _normalize(sums)
+    return centroids, assignments
+
+
+class IVFIndex:
+    def __init__(self, base, centroids, assignments, nprobe=8):
+        self.base = base
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.nprobe = nprobe
+        self._assignments = np.asarray(assignments, dtype=np.int64)
+        self._reorder()
+
+    @classmethod
+    def build(cls, base, n_lists=None, nprobe=8, n_iter=20, seed=0):
+        """Cluster the rows of a VectorIndex into n_lists lists.
+
+        n_lists defaults to about sqrt(rows), the usual IVF starting point.
+        """
+        n_lists = n_lists or max(1, int(np.sqrt(len(base))))
+        n_lists = min(n_lists, len(base))
+        centroids, assignments = spherical_kmeans(base.matrix, n_lists, n_iter, seed)
+        return cls(base, centroids, assignments, nprobe)
+
+    def __len__(self):
+        return len(self.base)
+
+    def _reorder(self):
+        # Keep each list's rows contiguous so probing a list is a slice, not a
+        # gather over scattered rows.
+        self._order = np.argsort(self._assignments, kind='stable')
+        counts = np.bincount(self._assignments, minlength=len(self.centroids))
+        self._offsets = np.concatenate(([0], np.cumsum(counts)))
+        self._sorted = np.ascontiguousarray(self.base.matrix[self._order])
+
+    def add(self, ids, vectors, metadata=None):
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.base.dim)
+        self.base.add(ids, vectors, metadata)
+        new_assignments = np.argmax(_normalize(vectors) @ self.centroids.T, axis=1)
+        self._assignments = np.concatenate((self._assignments, new_assignments))
+        self._reorder()
+
+    def search(self, query, k=10, nprobe=None):
+        if len(self.base) == 0:
+            return []
+        query = np.asarray(query, dtype=np.float32)
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        centroid_scores = self.centroids @ query
+        if nprobe < len(self.centroids):
+            probed = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        else:
+            probed = np.arange(len(self.centroids))
+
+        spans = [(self._offsets[i], self._offsets[i + 1]) for i in probed]
+        positions = np.concatenate([np.arange(start, end) for start, end in spans])
+        if len(positions) == 0:
+            return []
+        scores = np.concatenate([self._sorted[start:end] @ query for start, end in spans])
+        k = min(k, len(positions))
+        top = np.argpartition(-scores, k - 1)[:k] if k < len(positions) else np.arange(len(positions))
+        top = top[np.argsort(-scores[top])]
+        rows = self._order[positions[top]]
+        return [(self.base.ids[i], float(scores[j]), self.base.metadata[i]) for i, j in zip(rows, top)]
+
+    def save(self, prefix):
+        self.base.save(prefix)
+        np.savez(f'{prefix}.ivf.npz', centroids=self.centroids, assignments=self._assignments)
+
+    @classmethod
+    def load(cls, prefix, nprobe=8, mmap=True):
+        base = VectorIndex.load(prefix, mmap=mmap)
+        with np.load(f'{prefix}.ivf.npz') as data:
+            return cls(base, data['centroids'], data['assignments'], nprobe)
@@ -0,0 +1,283 @@
+"""SQLite-backed job queue for reviews and drafts that should not hold a request open.
+
+A POST with "async": true to a queued route is stored as a job and answered
+at once with 202 and a job id; a pool of JOB_WORKERS threads runs queued
+jobs in order, so a burst waits in the queue instead of timing out. Clients
+poll GET /api/jobs?id=<job id>, adding &wait=<seconds> to block until the
+job finishes; the wait is served on the app server's event loop, so pollers
+do not hold worker threads. Jobs survive a restart: queued jobs are picked up again, and
+jobs whose worker died are re-queued once their lease expires.
+
+The workers live in the serving process, so this needs a long-running
+server (the app server). On Vercel, where nothing runs after the response,
+"async" is ignored and the request is served synchronously.
+"""
+import asyncio
+import functools
+import importlib
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+
+from _lib import metrics
+from _lib.handlers import HTTPError
+from _lib.payloads import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+JOBS_ENABLED = os.environ.get('JOBS_DISABLED') != '1' and not os.environ.get('VERCEL')
+JOB_QUEUE_PATH = os.environ.get('JOB_QUEUE_PATH', os.path.join(tempfile.gettempdir(), 'application_jobs.sqlite3'))
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '4'))
+JOB_MAX_QUEUED = int(os.environ.get('JOB_MAX_QUEUED', '1000'))
+JOB_LEASE_SECONDS = float(os.environ.get('JOB_LEASE_SECONDS', '600'))
+JOB_RETENTION_SECONDS = float(os.environ.get('JOB_RETENTION_SECONDS', '86400'))
+JOB_MAX_WAIT_SECONDS = 60
+
+# Job route name -> "module:function", imported by the workers on first use.
+JOB_ROUTES = {
+    'submit_application': 'submit_application.index_dep:submit_application',
+    'create_application': 'create_application.index:create_application',
+}
+
+# Other processes may share the database, so idle workers look for new jobs
+# at least this often even when nothing in this process notified them.
+_POLL_SECONDS = 1.0
+
+
+class JobQueue:
+    def __init__(self, path, workers=4, max_queued=1000, routes=None):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.routes = dict(JOB_ROUTES if routes is None else routes)
+        self._resolved = {}
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            'id TEXT PRIMARY KEY, route TEXT NOT NULL, payload BLOB NOT NULL, status TEXT NOT NULL, '
+            'status_code INTEGER, result BLOB, error TEXT, '
+            'created_at REAL NOT NULL, started_at REAL, finished_at REAL)'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)')
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        # Status reads run on the app server's event loop, so they get their
+        # own connection and lock: in WAL mode a read never waits for a
+        # writer, and nothing holds _read_lock across a transaction the way
+        # _claim holds _lock.
+        self._reader = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._read_lock = threading.Lock()
+        # job id -> asyncio futures of wait_async() callers, resolved by _finish.
+        self._async_waiters = {}
+        self._waiters_lock = threading.Lock()
+        self._threads = []
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f'job-worker-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def enqueue(self, route, data):
+        if route not in self.routes:
+            raise ValueError(f"Unknown job route {route}")
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            [queued] = self._db.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()
+            if queued >= self.max_queued:
+                raise HTTPError(503, f"Job queue is full ({queued} jobs waiting)", json_body=True)
+            self._db.execute(
+                "INSERT INTO jobs (id, route, payload, status, created_at) VALUES (?, ?, ?, 'queued', ?)",
+                (job_id, route, dumps(data), time.time()),
+            )
+            self._changed.notify_all()
+        metrics.count('jobs_total', route=route, status='queued')
+        self.start()
+        return job_id
+
+    def get(self, job_id):
+        with self._read_lock:
+            return self._row(job_id)
+
+    async def wait_async(self, job_id, timeout):
+        """Return the job once it has finished, or as it is when timeout runs out.
+
+        Waits on the event loop; nothing blocks while the job runs.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            # Registered before the read, so a job finishing in between
+            # still wakes this waiter.
+            finished = loop.create_future()
+            with self._waiters_lock:
+                self._async_waiters.setdefault(job_id, []).append(finished)
+            try:
+                job = self.get(job_id)
+                remaining = deadline - loop.time()
+                if job is None or job["status"] in ('done', 'failed') or remaining <= 0:
+                    return job
+                await asyncio.wait([finished], timeout=min(remaining, _POLL_SECONDS))
+            finally:
+                with self._waiters_lock:
+                    waiters = self._async_waiters.get(job_id, [])
+                    if finished in waiters:
+                        waiters.remove(finished)
+                        if not waiters:
+                            del self._async_waiters[job_id]
+
+    def _row(self, job_id):
+        row = self._reader.execute(
+            'SELECT id, route, status, status_code, result, error, created_at, started_at, finished_at FROM jobs WHERE id = ?',
+            (job_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        job = {
+            "id": row[0], "route": row[1], "status": row[2],
+            "created_at": row[6], "started_at": row[7], "finished_at": row[8],
+        }
+        if row[2] == 'done':
+            job["status_code"] = row[3]
+            job["result"] = loads(row[4])
+        elif row[2] == 'failed':
+            job["status_code"] = row[3]
+            job["error"] = row[5]
+        return job
+
+    def _claim(self):
+        now = time.time()
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                # Jobs whose worker died (the process was killed mid-call)
+                # go back to the queue once their lease has run out.
+                self._db.execute(
+                    "UPDATE jobs SET status = 'queued', started_at = NULL WHERE status = 'running' AND started_at < ?",
+                    (now - JOB_LEASE_SECONDS,),
+                )
+                row = self._db.execute(
+                    "SELECT id, route, payload, created_at FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+                ).fetchone()
+                if row is not None:
+                    self._db.execute("UPDATE jobs SET status = 'running', started_at = ? WHERE id = ?", (now, row[0]))
+                self._db.execute('COMMIT')
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+        return row
+
+    def _finish(self, job_id, status, status_code, result=None, error=None):
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                'UPDATE jobs SET status = ?, status_code = ?, result = ?, error = ?, finished_at = ? WHERE id = ?',
+                (status, status_code, None if result is None else dumps(result), error, now, job_id),
+            )
+            self._db.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?",
+                (now - JOB_RETENTION_SECONDS,),
+            )
+            self._changed.notify_all()
+        with self._waiters_lock:
+            waiters = self._async_waiters.pop(job_id, ())
+        for waiter in waiters:
+            waiter.get_loop().call_soon_threadsafe(_wake, waiter)
+
+    def _resolve(self, route):
+        if route not in self._resolved:
+            module_name, function_name = self.routes[route].split(':')
+            self._resolved[route] = getattr(importlib.import_module(module_name), function_name)
+        return self._resolved[route]
+
+    def _work(self):
+        while True:
+            try:
+                job = self._claim()
+            except sqlite3.Error as e:
+                logger.error(f"Could not claim a job: {str(e)}")
+                job = None
+            if job is None:
+                with self._lock:
+                    self._changed.wait(_POLL_SECONDS)
+                continue
+            self._run(*job)
+
+    def _run(self, job_id, route, payload, created_at):
+        metrics.observe('job_queue_wait_seconds', time.time() - created_at, route=route)
+        try:
+            status_code, result = self._resolve(route)(loads(payload), None)
+        except HTTPError as e:
+            self._finish(job_id, 'failed', e.status, error=e.message)
+            metrics.count('jobs_total', route=route, status='failed')
+            return
+        except Exception as e:
+            logger.exception(f"Job {job_id} ({route}) failed")
+            self._finish(job_id, 'failed', 500, error=str(e))
+            metrics.count('jobs_total', route=route, status='failed')
+            return
+        self._finish(job_id, 'done', status_code, result=result)
+        metrics.count('jobs_total', route=route, status='done')
+
+
+def _wake(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_queue():
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = JobQueue(JOB_QUEUE_PATH, workers=JOB_WORKERS, max_queued=JOB_MAX_QUEUED)
+                # Jobs left queued by a previous run start as soon as anyone
+                # touches the queue, not only on the next enqueue.
+                _queue.start()
+    return _queue
+
+
+def queued(name):
+    """Decorate a route so "async": true bodies are run as background jobs.
+
+    The job runs the same (decorated) route with "async" and "stream" removed,
+    and its (status, payload) is what GET /api/jobs returns as the result.
+    """
+    def decorator(route):
+        @functools.wraps(route)
+        def wrapper(data, headers=None):
+            if not data.get('async') or not JOBS_ENABLED:
+                return route(data, headers)
+            job_data = {key: value for key, value in data.items() if key not in ('async', 'stream')}
+            job_id = get_queue().enqueue(name, job_data)
+            return 202, {"success": True, "job_id": job_id, "status": "queued", "status_url": f"/api/jobs?id={job_id}"}
+        return wrapper
+    return decorator
+
+
+async def job_status_route(query=None):
+    query = query or {}
+    job_id = (query.get('id') or [''])[0]
+    if not job_id:
+        raise HTTPError(400, 'id is required', json_body=True)
+    try:
+        wait = min(float((query.get('wait') or ['0'])[0]), JOB_MAX_WAIT_SECONDS)
+    except ValueError:
+        raise HTTPError(400, 'wait must be a number of seconds', json_body=True)
+    # The first call opens the database; keep that off the event loop.
+    queue = _queue if _queue is not None else await asyncio.get_running_loop().run_in_executor(None, get_queue)
+    job = await queue.wait_async(job_id, wait) if wait > 0 else queue.get(job_id)
+    if job is None:
+        raise HTTPError(404, f"No job {job_id}", json_body=True)
+    return 200, job
@@ -0,0 +1,167 @@
+"""Lightweight per-stage latency and token metrics for the Python endpoints.
+
+Histograms and counters are kept in process and can be read at GET /metrics
+on the app server (Prometheus text format) or dumped as JSON to
+METRICS_DUMP_PATH every METRICS_DUMP_INTERVAL seconds. METRICS_ENABLED=0
+turns every call here into an immediate return.
+
+    with timed('request_stage_seconds', endpoint='/api/calculate_scores', stage='parse'):
+        ...
+"""
+from contextlib import nullcontext
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') != '0'
+METRICS_DUMP_PATH = os.environ.get('METRICS_DUMP_PATH')
+METRICS_DUMP_INTERVAL = float(os.environ.get('METRICS_DUMP_INTERVAL', '60'))
+
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+TOKENS_PER_SECOND_BUCKETS = (5, 10, 20, 40, 60, 80, 100, 150, 200, 300, 500)
+
+_NOOP = nullcontext()
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def observe(name, value, buckets=SECONDS_BUCKETS, **labels):
+    if not METRICS_ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = Histogram(buckets)
+        histogram.observe(value)
+
+
+def count(name, value=1, **labels):
+    if not METRICS_ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+class _Timer:
+    __slots__ = ('name', 'labels', 'started')
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.name, time.perf_counter() - self.started, **self.labels)
+        return False
+
+
+def timed(name, **labels):
+    """Context manager observing its duration in seconds."""
+    if not METRICS_ENABLED:
+        return _NOOP
+    return _Timer(name, labels)
+
+
+def record_usage(model, usage, seconds, operation='chat'):
+    """Count a completion's tokens and its output-token throughput."""
+    if not METRICS_ENABLED or usage is None:
+        return
+    count('model_tokens_total', usage.prompt_tokens, model=model, kind='prompt', operation=operation)
+    completion_tokens = getattr(usage, 'completion_tokens', None) or 0
+    if completion_tokens:
+        count('model_tokens_total', completion_tokens, model=model, kind='completion', operation=operation)
+        if seconds > 0:
+            observe('model_output_tokens_per_second', completion_tokens / seconds, TOKENS_PER_SECOND_BUCKETS, model=model)
+
+
+def snapshot():
+    with _lock:
+        histograms = {key: (h.buckets, list(h.counts), h.sum, h.count) for key, h in _histograms.items()}
+        counters = dict(_counters)
+    return {
+        "histograms": [
+            {"name": name, "labels": dict(labels), "buckets": list(buckets), "counts": counts, "sum": total, "count": n}
+            for (name, labels), (buckets, counts, total, n) in histograms.items()
+        ],
+        "counters": [
+            {"name": name, "labels": dict(labels), "value": value} for (name, labels), value in counters.items()
+        ],
+    }
+
+
+def _format_labels(labels, extra=None):
+    items = list(labels.items()) + (list(extra.items()) if extra else [])
+    if not items:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"') for _, value in items)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(items, escaped)) + '}'
+
+
+def render_prometheus():
+    data = snapshot()
+    lines = []
+    for counter in sorted(data["counters"], key=lambda c: c["name"]):
+        lines.append(f'{counter["name"]}{_format_labels(counter["labels"])} {counter["value"]}')
+    for histogram in sorted(data["histograms"], key=lambda h: h["name"]):
+        name, labels = histogram["name"], histogram["labels"]
+        cumulative = 0
+        for bound, bucket_count in zip(list(histogram["buckets"]) + ['+Inf'], histogram["counts"]):
+            cumulative += bucket_count
+            lines.append(f'{name}_bucket{_format_labels(labels, {"le": bound})} {cumulative}')
+        lines.append(f'{name}_sum{_format_labels(labels)} {histogram["sum"]}')
+        lines.append(f'{name}_count{_format_labels(labels)} {histogram["count"]}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_route(query=None):
+    return 200, render_prometheus()
+
+
+def dump(path):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as file:
+        json.dump(snapshot(), file)
+    os.replace(tmp_path, path)
+
+
+def _dump_forever(path, interval):
+    while True:
+        time.sleep(interval)
+        try:
+            dump(path)
+        except OSError as e:
+            logger.error(f"Could not dump metrics to {path}: {str(e)}")
+
+
+if METRICS_ENABLED and METRICS_DUMP_PATH:
+    threading.Thread(
+        target=_dump_forever, args=(METRICS_DUMP_PATH, METRICS_DUMP_INTERVAL), name='metrics-dump', daemon=True
+    ).start()
@@ -0,0 +1,227 @@
+"""Route model calls across a fallback chain, hedging slow requests.
+
+Callers still name a model, but the call goes through ModelRouter.call,
+which tries the requested model and its fallbacks from MODEL_FALLBACKS
+(JSON, {"model": ["fallback", ...]}):
+
+- Candidates are ordered by a per-endpoint EWMA of their latency, fastest
+  first, and models that failed MODEL_UNHEALTHY_AFTER times in a row sit
+  out for MODEL_COOLDOWN_SECONDS.
+- With MODEL_HEDGING=1, if the first candidate has not answered after its
+  hedge delay (a multiple of its EWMA, or MODEL_HEDGE_AFTER_SECONDS before
+  there is one), a second request goes to the next configured fallback and
+  whichever finishes first wins. A model is never hedged against itself, so
+  a slow call is not billed twice for the same model; without a fallback
+  chain nothing is hedged.
+- Rate limits, server errors, timeouts and unknown models move on to the
+  next candidate; other errors (a bad request) are raised as they are.
+
+MODEL_ROUTER_DISABLED=1 sends every call straight to the requested model.
+"""
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import json
+import logging
+import os
+import threading
+import time
+
+from openai import NotFoundError
+
+from _lib import metrics
+from _lib.openai_client import OPENAI_MAX_CONNECTIONS, _is_retryable
+
+logger = logging.getLogger(__name__)
+
+MODEL_ROUTER_DISABLED = os.environ.get('MODEL_ROUTER_DISABLED') == '1'
+# Opt-in: a model listed here may be served by its fallbacks whenever they
+# are faster, not only when it fails, e.g.
+# MODEL_FALLBACKS='{"gpt-4o": ["gpt-4o-2024-08-06"], "gpt-4o-mini": ["gpt-4o"]}'
+MODEL_FALLBACKS = json.loads(os.environ.get('MODEL_FALLBACKS', '{}'))
+MODEL_HEDGING = os.environ.get('MODEL_HEDGING') == '1'
+MODEL_HEDGE_AFTER_SECONDS = float(os.environ.get('MODEL_HEDGE_AFTER_SECONDS', '8'))
+MODEL_HEDGE_MIN_SECONDS = float(os.environ.get('MODEL_HEDGE_MIN_SECONDS', '1'))
+MODEL_HEDGE_MULTIPLIER = float(os.environ.get('MODEL_HEDGE_MULTIPLIER', '2'))
+MODEL_EWMA_ALPHA = float(os.environ.get('MODEL_EWMA_ALPHA', '0.2'))
+MODEL_UNHEALTHY_AFTER = int(os.environ.get('MODEL_UNHEALTHY_AFTER', '3'))
+MODEL_COOLDOWN_SECONDS = float(os.environ.get('MODEL_COOLDOWN_SECONDS', '30'))
+
+
+def can_fall_back(error):
+    return _is_retryable(error) or isinstance(error, NotFoundError)
+
+
+class _ModelStats:
+    __slots__ = ('ewma', 'calls', 'errors', 'consecutive_errors', 'unhealthy_until')
+
+    def __init__(self):
+        self.ewma = None
+        self.calls = 0
+        self.errors = 0
+        self.consecutive_errors = 0
+        self.unhealthy_until = 0.0
+
+
+class ModelRouter:
+    def __init__(self, fallbacks=None, max_workers=OPENAI_MAX_CONNECTIONS):
+        self.fallbacks = MODEL_FALLBACKS if fallbacks is None else fallbacks
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='model-router')
+
+    def _get(self, endpoint, model):
+        key = (endpoint, model)
+        if key not in self._stats:
+            self._stats[key] = _ModelStats()
+        return self._stats[key]
+
+    def candidates(self, endpoint, model):
+        """The requested model and its fallbacks, healthy and fastest first.
+
+        Models without a latency estimate yet sort first so they get one;
+        the sort is stable, so ties keep the configured order.
+        """
+        chain = [model] + [fallback for fallback in self.fallbacks.get(model, []) if fallback != model]
+        now = time.monotonic()
+        with self._lock:
+            stats = {candidate: self._get(endpoint, candidate) for candidate in chain}
+            return sorted(chain, key=lambda candidate: (
+                stats[candidate].unhealthy_until > now,
+                stats[candidate].ewma or 0.0,
+            ))
+
+    def hedge_delay(self, endpoint, model):
+        with self._lock:
+            ewma = self._get(endpoint, model).ewma
+        if ewma is None:
+            return MODEL_HEDGE_AFTER_SECONDS
+        return max(MODEL_HEDGE_MIN_SECONDS, MODEL_HEDGE_MULTIPLIER * ewma)
+
+    def record(self, endpoint, model, seconds, error=None):
+        with self._lock:
+            stats = self._get(endpoint, model)
+            stats.calls += 1
+            if error is None:
+                stats.ewma = seconds if stats.ewma is None else MODEL_EWMA_ALPHA * seconds + (1 - MODEL_EWMA_ALPHA) * stats.ewma
+                stats.consecutive_errors = 0
+                return
+            stats.errors += 1
+            if can_fall_back(error):
+                stats.consecutive_errors += 1
+                if stats.consecutive_errors >= MODEL_UNHEALTHY_AFTER:
+                    stats.unhealthy_until = time.monotonic() + MODEL_COOLDOWN_SECONDS
+                    logger.warning(f"{model} failed {stats.consecutive_errors} times in a row on {endpoint}, "
+                                   f"skipping it for {MODEL_COOLDOWN_SECONDS}s")
+
+    def _timed(self, endpoint, model, fn, max_retries, running=None):
+        if running is not None:
+            running.set()
+        started = time.monotonic()
+        try:
+            result = fn(model, max_retries)
+        except Exception as e:
+            self.record(endpoint, model, time.monotonic() - started, e)
+            raise
+        self.record(endpoint, model, time.monotonic() - started)
+        return result
+
+    def call(self, endpoint, model, fn, hedge=True):
+        """Return fn(model, max_retries) from the first candidate to succeed.
+
+        fn makes the model call. Every candidate but the last gets
+        max_retries=0, so a failing model hands over to the next one at once
+        instead of backing off first; the last one gets None (the default
+        retry policy). Unless the call may be hedged, candidates are tried in
+        turn on the caller's thread.
+        """
+        if MODEL_ROUTER_DISABLED:
+            return fn(model, None)
+
+        queue = self.candidates(endpoint, model)
+        if hedge and MODEL_HEDGING and len(queue) > 1:
+            return self._call_hedged(endpoint, queue, fn)
+
+        for i, candidate in enumerate(queue):
+            last = i == len(queue) - 1
+            try:
+                result = self._timed(endpoint, candidate, fn, None if last else 0)
+            except Exception as e:
+                if last or not can_fall_back(e):
+                    raise
+                logger.warning(f"{candidate} failed on {endpoint}: {str(e)}")
+                continue
+            metrics.count('model_router_total', endpoint=endpoint, model=candidate,
+                          outcome='primary' if i == 0 else 'fallback')
+            return result
+
+    def _call_hedged(self, endpoint, queue, fn):
+        in_flight = {}
+        last_error = None
+
+        def launch(reason):
+            candidate = queue.pop(0)
+            running = threading.Event()
+            future = self._executor.submit(self._timed, endpoint, candidate, fn, 0 if queue else None, running)
+            in_flight[future] = (candidate, reason)
+            return candidate, running
+
+        def start(reason):
+            # Only a request with a fallback left behind it is hedged, and
+            # only once: its hedge goes to that fallback. The clock starts
+            # when a pool thread picks the request up, so time spent waiting
+            # for a thread does not count as the model being slow.
+            candidate, running = launch(reason)
+            if not queue:
+                return candidate, None
+            running.wait()
+            return candidate, time.monotonic() + self.hedge_delay(endpoint, candidate)
+
+        current, deadline = start('primary')
+        while in_flight:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                deadline = None
+                launched, _ = launch('hedge')
+                logger.info(f"{current} is slow on {endpoint}, hedging with {launched}")
+                continue
+            for future in done:
+                candidate, reason = in_flight.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    if not can_fall_back(e):
+                        raise
+                    logger.warning(f"{candidate} failed on {endpoint}: {str(e)}")
+                    last_error = e
+                    continue
+                metrics.count('model_router_total', endpoint=endpoint, model=candidate, outcome=reason)
+                # The losing request is left to finish on its own; its
+                # latency still updates the EWMA.
+                return result
+            if not in_flight and queue:
+                current, deadline = start('fallback')
+        raise last_error
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "endpoint": endpoint,
+                    "model": model,
+                    "ewma_seconds": stats.ewma,
+                    "calls": stats.calls,
+                    "errors": stats.errors,
+                    "healthy": stats.unhealthy_until <= now,
+                }
+                for (endpoint, model), stats in self._stats.items()
+            ]
+
+
+# Hedged calls run on this pool, at most one primary and one hedge each; size
+# it like the connection pool so it is never the narrower of the two.
+router = ModelRouter(max_workers=int(os.environ.get('MODEL_ROUTER_WORKERS', str(OPENAI_MAX_CONNECTIONS))))
+
+
+def router_stats_route(query=None):
+    return 200, {"fallbacks": router.fallbacks, "models": router.stats()}
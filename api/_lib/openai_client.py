@@ -0,0 +1,179 @@
+"""One pooled OpenAI client per process, with retry and timeout policy.
+
+Every endpoint shares the same keep-alive connection pool instead of
+building its own client, so bursts reuse warm TLS connections. The SDK's
+own retries are turned off in favour of with_retries(): jittered
+exponential backoff on 429/5xx and connection errors that honors the
+server's Retry-After, and a per-call timeout.
+"""
+from openai import APIConnectionError, APIStatusError, DefaultHttpxClient, OpenAI
+import httpx
+import logging
+import os
+import random
+import threading
+import time
+
+from _lib import metrics
+
+logger = logging.getLogger(__name__)
+
+OPENAI_MAX_CONNECTIONS = int(os.environ.get('OPENAI_MAX_CONNECTIONS', '100'))
+OPENAI_MAX_KEEPALIVE = int(os.environ.get('OPENAI_MAX_KEEPALIVE', '20'))
+OPENAI_KEEPALIVE_EXPIRY = float(os.environ.get('OPENAI_KEEPALIVE_EXPIRY', '60'))
+OPENAI_CONNECT_TIMEOUT = float(os.environ.get('OPENAI_CONNECT_TIMEOUT', '5'))
+OPENAI_TIMEOUT = float(os.environ.get('OPENAI_TIMEOUT', '60'))
+OPENAI_MAX_RETRIES = int(os.environ.get('OPENAI_MAX_RETRIES', '3'))
+OPENAI_BACKOFF_BASE = float(os.environ.get('OPENAI_BACKOFF_BASE', '0.5'))
+OPENAI_BACKOFF_MAX = float(os.environ.get('OPENAI_BACKOFF_MAX', '20'))
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+_client = None
+_client_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats = {
+    "calls": 0,
+    "in_flight": 0,
+    "max_in_flight": 0,
+    "retries": 0,
+    "failures": 0,
+    "http_requests": 0,
+}
+
+
+def get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                http_client = DefaultHttpxClient(
+                    limits=httpx.Limits(
+                        max_connections=OPENAI_MAX_CONNECTIONS,
+                        max_keepalive_connections=OPENAI_MAX_KEEPALIVE,
+                        keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY,
+                    ),
+                    timeout=httpx.Timeout(OPENAI_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT),
+                    event_hooks={'request': [_count_http_request]},
+                )
+                _client = OpenAI(
+                    api_key=os.environ.get("OPENAI_API_KEY"),
+                    http_client=http_client,
+                    max_retries=0,
+                )
+    return _client
+
+
+def _count_http_request(request):
+    with _stats_lock:
+        _stats["http_requests"] += 1
+
+
+def _retry_after(error):
+    response = getattr(error, 'response', None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if headers.get('retry-after-ms'):
+            return float(headers['retry-after-ms']) / 1000
+        if headers.get('retry-after'):
+            return float(headers['retry-after'])
+    except ValueError:
+        # Retry-After may also be an HTTP date; fall back to our own backoff.
+        return None
+    return None
+
+
+def _is_retryable(error):
+    if isinstance(error, APIConnectionError):
+        return True
+    return isinstance(error, APIStatusError) and error.status_code in RETRYABLE_STATUS
+
+
+def backoff_delay(attempt, error=None):
+    retry_after = _retry_after(error) if error is not None else None
+    if retry_after is not None and 0 <= retry_after <= OPENAI_BACKOFF_MAX:
+        return retry_after
+    return random.uniform(0, min(OPENAI_BACKOFF_MAX, OPENAI_BACKOFF_BASE * 2 ** attempt))
+
+
+def with_retries(call, *args, max_retries=None, deadline=None, **kwargs):
+    """Run an SDK call, retrying transient failures with backoff.
+
+    With a deadline (a time.monotonic() value), each attempt's timeout is cut
+    to the time left and no retry is started that would begin after it.
+    """
+    if max_retries is None:
+        max_retries = OPENAI_MAX_RETRIES
+    with _stats_lock:
+        _stats["calls"] += 1
+        _stats["in_flight"] += 1
+        _stats["max_in_flight"] = max(_stats["max_in_flight"], _stats["in_flight"])
+    try:
+        for attempt in range(max_retries + 1):
+            if deadline is not None:
+                kwargs['timeout'] = max(0.0, min(kwargs.get('timeout') or OPENAI_TIMEOUT, deadline - time.monotonic()))
+            try:
+                return call(*args, **kwargs)
+            except Exception as e:
+                retry = attempt < max_retries and _is_retryable(e)
+                delay = backoff_delay(attempt, e) if retry else 0
+                if retry and deadline is not None and time.monotonic() + delay >= deadline:
+                    retry = False
+                if not retry:
+                    with _stats_lock:
+                        _stats["failures"] += 1
+                    raise
+                logger.warning(f"OpenAI call failed ({str(e)}), retry {attempt + 1}/{max_retries} in {delay:.2f}s")
+                with _stats_lock:
+                    _stats["retries"] += 1
+                time.sleep(delay)
+    finally:
+        with _stats_lock:
+            _stats["in_flight"] -= 1
+
+
+def _timed_call(operation, call, timeout, kwargs):
+    # Streams return once headers arrive; their round-trip is the time to
+    # first byte and their usage is recorded by the caller.
+    started = time.perf_counter()
+    response = with_retries(call, timeout=timeout or OPENAI_TIMEOUT, **kwargs)
+    elapsed = time.perf_counter() - started
+    model = kwargs.get('model', '')
+    metrics.observe('model_call_seconds', elapsed, model=model, operation=operation)
+    if not kwargs.get('stream'):
+        metrics.record_usage(model, getattr(response, 'usage', None), elapsed, operation)
+    return response
+
+
+def chat_completion(timeout=None, **kwargs):
+    return _timed_call('chat', get_client().chat.completions.create, timeout, kwargs)
+
+
+def create_embeddings(timeout=None, **kwargs):
+    return _timed_call('embeddings', get_client().embeddings.create, timeout, kwargs)
+
+
+def pool_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["limits"] = {
+        "max_connections": OPENAI_MAX_CONNECTIONS,
+        "max_keepalive_connections": OPENAI_MAX_KEEPALIVE,
+        "keepalive_expiry": OPENAI_KEEPALIVE_EXPIRY,
+    }
+    # httpcore's pool is private API; report it when it is there to read.
+    try:
+        connections = get_client()._client._transport._pool.connections
+        stats["connections"] = {
+            "open": len(connections),
+            "idle": sum(1 for connection in connections if connection.is_idle()),
+        }
+    except AttributeError:
+        pass
+    return stats
+
+
+def pool_stats_route(query=None):
+    return 200, pool_stats()
@@ -0,0 +1,52 @@
+"""JSON encoding and payload logging shared by every endpoint.
+
+orjson is used for encoding and decoding when it is installed. Request
+bodies and prompts are only logged for a LOG_PAYLOAD_SAMPLE_RATE fraction
+of requests, and then cut to LOG_PAYLOAD_MAX_CHARS, so large imported
+drafts do not turn into log I/O.
+"""
+import json
+import logging
+import os
+import random
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+LOG_PAYLOAD_SAMPLE_RATE = float(os.environ.get('LOG_PAYLOAD_SAMPLE_RATE', '0.01'))
+LOG_PAYLOAD_MAX_CHARS = int(os.environ.get('LOG_PAYLOAD_MAX_CHARS', '500'))
+
+
+if orjson is not None:
+    def loads(data):
+        return orjson.loads(data)
+
+    def dumps(payload):
+        return orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+else:
+    def loads(data):
+        return json.loads(data)
+
+    def dumps(payload):
+        return json.dumps(payload).encode('utf-8')
+
+
+def truncate(text, max_chars=None):
+    if max_chars is None:
+        max_chars = LOG_PAYLOAD_MAX_CHARS
+    if len(text) <= max_chars:
+        return text
+    return f"{text[:max_chars]}... [{len(text) - max_chars} more chars]"
+
+
+def log_payload(logger, label, payload, level=logging.INFO):
+    """Log a truncated request body or prompt for a sample of requests.
+
+    Nothing is serialized unless the request is sampled.
+    """
+    if not logger.isEnabledFor(level) or random.random() >= LOG_PAYLOAD_SAMPLE_RATE:
+        return
+    text = payload if isinstance(payload, str) else dumps(payload).decode('utf-8')
+    logger.log(level, f"{label}: {truncate(text)}")
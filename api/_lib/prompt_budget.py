@@ -0,0 +1,154 @@
+"""Local token counting and a per-model prompt budget.
+
+Counts use tiktoken when it is installed and its encoding has loaded,
+otherwise a four-characters-per-token estimate. Over-budget prompts are
+brought down by trimming the middle out of the longest free-text fields,
+imported draft first, so the opening and closing of each survive.
+"""
+import json
+import logging
+import os
+import re
+import threading
+
+logger = logging.getLogger(__name__)
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Input-token budget per model for system prompt + user prompt. Kept well
+# under each context window so the completion has room and users are not
+# charged for pasted-in bulk. PROMPT_TOKEN_BUDGETS (JSON) overrides entries.
+DEFAULT_PROMPT_BUDGET = 8000
+PROMPT_BUDGETS = {
+    'gpt-4o': 16000,
+    'gpt-4o-mini': 16000,
+    'gpt-4-turbo': 16000,
+    'gpt-4': 6000,
+    'gpt-3.5-turbo': 12000,
+}
+PROMPT_BUDGETS.update(json.loads(os.environ.get('PROMPT_TOKEN_BUDGETS', '{}')))
+
+# A trimmed field never drops below this many tokens.
+MIN_FIELD_TOKENS = 200
+
+TRIM_MARKER = '\n[...]\n'
+
+# model -> tiktoken Encoding, or None if it could not be loaded.
+_encodings = {}
+_loading = set()
+_encodings_lock = threading.Lock()
+
+
+def _load_encoding(model):
+    try:
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            encoding = tiktoken.get_encoding('o200k_base')
+    except Exception as e:
+        logger.warning(f"Could not load tokenizer for {model}, estimating token counts: {str(e)}")
+        encoding = None
+    with _encodings_lock:
+        _encodings[model] = encoding
+        _loading.discard(model)
+
+
+def _encoding(model):
+    """The model's encoding, or None (use the estimate) until it has loaded.
+
+    tiktoken downloads the BPE files on first use unless they are already
+    in TIKTOKEN_CACHE_DIR, with no timeout, so they are loaded on a
+    background thread; no request waits on the download.
+    """
+    if tiktoken is None:
+        return None
+    with _encodings_lock:
+        if model in _encodings:
+            return _encodings[model]
+        if model not in _loading:
+            _loading.add(model)
+            threading.Thread(target=_load_encoding, args=(model,), name='tiktoken-load', daemon=True).start()
+    return None
+
+
+# Start loading the budgeted models' encodings as soon as the module is imported.
+for _model in PROMPT_BUDGETS:
+    _encoding(_model)
+
+
+def count_tokens(text, model):
+    if not text:
+        return 0
+    encoding = _encoding(model)
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def prompt_budget(model):
+    return PROMPT_BUDGETS.get(model, DEFAULT_PROMPT_BUDGET)
+
+
+def compact_text(text):
+    """Strip trailing spaces and collapse runs of blank lines."""
+    if text is None:
+        return ''
+    text = re.sub(r'[ \t]+\n', '\n', str(text))
+    return re.sub(r'\n{3,}', '\n\n', text).strip()
+
+
+def truncate_to_tokens(text, max_tokens, model):
+    """Keep the first two thirds and last third of max_tokens of text."""
+    encoding = _encoding(model)
+    if encoding is None:
+        max_chars = max_tokens * 4
+        if len(text) <= max_chars:
+            return text
+        head = max_chars * 2 // 3
+        return text[:head] + TRIM_MARKER + text[len(text) - (max_chars - head):]
+
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    head = max_tokens * 2 // 3
+    return encoding.decode(tokens[:head]) + TRIM_MARKER + encoding.decode(tokens[len(tokens) - (max_tokens - head):])
+
+
+def fit_prompt(template, fields, model, system_prompt='', trim_first=(), baseline=None):
+    """Fill template from fields, trimming fields until the prompt fits.
+
+    Fields named in trim_first are trimmed in that order, then any others,
+    longest first. Returns (prompt, stats) where stats has the budget, the
+    estimated input tokens, the names of the trimmed fields and, when a
+    baseline prompt is given, the tokens saved against it.
+    """
+    fields = {name: compact_text(value) for name, value in fields.items()}
+    budget = prompt_budget(model)
+    prompt = template.format(**fields)
+    over = count_tokens(system_prompt, model) + count_tokens(prompt, model) - budget
+
+    trimmed = []
+    if over > 0:
+        field_tokens = {name: count_tokens(value, model) for name, value in fields.items()}
+        rest = sorted((name for name in fields if name not in trim_first), key=field_tokens.get, reverse=True)
+        for name in [name for name in trim_first if name in fields] + rest:
+            keep = max(MIN_FIELD_TOKENS, field_tokens[name] - over)
+            if keep >= field_tokens[name]:
+                continue
+            fields[name] = truncate_to_tokens(fields[name], keep, model)
+            over -= field_tokens[name] - count_tokens(fields[name], model)
+            trimmed.append(name)
+            if over <= 0:
+                break
+        prompt = template.format(**fields)
+
+    prompt_tokens = count_tokens(prompt, model)
+    return prompt, {
+        "budget": budget,
+        "input_tokens": count_tokens(system_prompt, model) + prompt_tokens,
+        "trimmed_fields": trimmed,
+        "tokens_saved": max(0, count_tokens(baseline, model) - prompt_tokens) if baseline is not None else 0,
+    }
@@ -0,0 +1,30 @@
+"""Prompt layout for provider-side prefix caching, and its measurement.
+
+OpenAI reuses the longest previously seen prefix of a prompt (from 1024
+tokens on) and bills those tokens at a discount, with lower latency. The
+firm system prompts are large and identical across requests, so they go
+first and nothing per-request is spliced into them: retrieved examples
+follow in a message of their own, then the user prompt.
+"""
+from _lib import metrics
+
+
+def chat_messages(system_prompt, user_prompt, examples=''):
+    messages = [{"role": "system", "content": system_prompt}]
+    if examples:
+        messages.append({"role": "system", "content": f"Similar applications:\n\n{examples}"})
+    messages.append({"role": "user", "content": user_prompt})
+    return messages
+
+
+def prompt_cache_usage(usage, firm=None):
+    """Split a completion's prompt tokens into cached and uncached ones."""
+    if usage is None:
+        return {"cached_tokens": None, "uncached_tokens": None}
+    details = getattr(usage, 'prompt_tokens_details', None)
+    cached = getattr(details, 'cached_tokens', None) or 0
+    stats = {"cached_tokens": cached, "uncached_tokens": usage.prompt_tokens - cached}
+    if firm:
+        metrics.count('prompt_cache_tokens_total', stats["cached_tokens"], firm=firm, kind='cached')
+        metrics.count('prompt_cache_tokens_total', stats["uncached_tokens"], firm=firm, kind='uncached')
+    return stats
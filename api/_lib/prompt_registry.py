@@ -0,0 +1,113 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_WORD_LIMIT = re.compile(r'\(\s*\d+\s*words?(\s+max(imum)?)?\s*\)\s*$', re.I)
+_NON_WORD = re.compile(r'[^0-9a-z]+')
+
+
+def normalize_question(question):
+    """Key a question so spacing, case, punctuation and a trailing
+    "(250 words max)" do not stop it matching its prompt."""
+    question = _WORD_LIMIT.sub('', question or '')
+    return _NON_WORD.sub(' ', question.casefold()).strip()
+
+
+class PromptRegistry:
+    """System prompts indexed by (firm, normalized question).
+
+    The firms, their models and prompt files are listed in a JSON manifest
+    next to the prompts:
+
+        {"Firm": {"model": "gpt-4o", "prompt": "firm_prompt.txt",
+                  "questions": {"Question text": "question_prompt.txt"}}}
+
+    Prompt files are read on first use (or by preload()) and both the manifest
+    and the files are re-read when their mtime changes, checked at most every
+    check_interval seconds, so firms and prompts can be added or edited
+    without a restart.
+    """
+
+    def __init__(self, directory, manifest='prompts.json', check_interval=2.0):
+        self.directory = directory
+        self.manifest_path = os.path.join(directory, manifest)
+        self.check_interval = check_interval
+        self._lock = threading.RLock()
+        self._manifest_mtime = None
+        self._manifest_checked = 0.0
+        self._firms = {}
+        self._index = {}
+        self._texts = {}
+
+    def _load_manifest(self):
+        mtime = os.stat(self.manifest_path).st_mtime
+        if mtime == self._manifest_mtime:
+            return
+        with open(self.manifest_path, 'r', encoding='utf-8') as file:
+            manifest = json.load(file)
+
+        firms = {}
+        index = {}
+        for firm, entry in manifest.items():
+            firms[firm] = entry['model']
+            index[(firm, None)] = entry['prompt']
+            for question, filename in entry.get('questions', {}).items():
+                index[(firm, normalize_question(question))] = filename
+        self._firms = firms
+        self._index = index
+        self._manifest_mtime = mtime
+        logger.info(f"Loaded prompt manifest with {len(firms)} firms")
+
+    def _refresh(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._manifest_mtime is None or now - self._manifest_checked >= self.check_interval:
+                self._manifest_checked = now
+                self._load_manifest()
+
+    def _read(self, filename):
+        path = os.path.join(self.directory, filename)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._texts.get(filename)
+            if cached is not None and now - cached[1] < self.check_interval:
+                return cached[2]
+            mtime = os.stat(path).st_mtime
+            if cached is None or cached[0] != mtime:
+                with open(path, 'r', encoding='utf-8') as file:
+                    text = file.read()
+            else:
+                text = cached[2]
+            self._texts[filename] = (mtime, now, text)
+            return text
+
+    def firms(self):
+        self._refresh()
+        return list(self._firms)
+
+    def lookup(self, firm, question):
+        """Return (system_prompt, model), or None if the firm is not active."""
+        self._refresh()
+        model = self._firms.get(firm)
+        if model is None:
+            return None
+        filename = self._index.get((firm, normalize_question(question))) or self._index[(firm, None)]
+        return self._read(filename), model
+
+    def preload(self):
+        self._refresh()
+        for filename in set(self._index.values()):
+            try:
+                self._read(filename)
+            except OSError as e:
+                logger.error(f"Could not preload prompt {filename}: {str(e)}")
+
+    def preload_in_background(self):
+        thread = threading.Thread(target=self.preload, name='prompt-preload', daemon=True)
+        thread.start()
+        return thread
@@ -0,0 +1,142 @@
+"""User-prompt templates, compiled once from prompt_templates.json.
+
+Each kind of prompt (draft, submission, review) has a default template and
+optional per-firm ones, which may in turn have per-question ones:
+
+    {"draft": {"default": {"template": [lines], "fields": {...}, "trim_first": [...]},
+               "firms": {"<firm>": {..., "questions": {"<question>": {...}}}}}}
+
+"fields" is the template's schema: every {placeholder} must be declared
+there and every declared field must be used. A field is {"required": true}
+or has a "default" (the empty string if not given). Templates are parsed and
+checked when this module is imported, so a broken template stops the server
+from starting instead of failing a request; requests only fill the slots.
+
+    python api/_lib/prompt_templates.py     # validate and list the templates
+"""
+import json
+import os
+import string
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from _lib.prompt_registry import normalize_question
+
+PROMPT_TEMPLATES_PATH = os.environ.get(
+    'PROMPT_TEMPLATES_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'prompt_templates.json')
+)
+
+
+class TemplateError(ValueError):
+    pass
+
+
+class PromptTemplate:
+    def __init__(self, name, text, fields=None, trim_first=()):
+        self.name = name
+        self.text = text
+        self.segments = []
+        used = set()
+        try:
+            parsed = list(string.Formatter().parse(text))
+        except ValueError as e:
+            raise TemplateError(f"Template {name}: {str(e)}")
+        for literal, field, format_spec, conversion in parsed:
+            if literal:
+                self.segments.append((True, literal))
+            if field is None:
+                continue
+            if not field.isidentifier() or format_spec or conversion:
+                raise TemplateError(f"Template {name}: {{{field}}} must be a plain field name")
+            self.segments.append((False, field))
+            used.add(field)
+
+        self.fields = {}
+        for field, spec in (fields or {}).items():
+            if spec.get('required') and 'default' in spec:
+                raise TemplateError(f"Template {name}: field {field!r} cannot be required and have a default")
+            if not isinstance(spec.get('default', ''), str):
+                raise TemplateError(f"Template {name}: the default for {field!r} must be a string")
+            self.fields[field] = spec
+        if used - set(self.fields):
+            raise TemplateError(f"Template {name} uses undeclared fields: {', '.join(sorted(used - set(self.fields)))}")
+        if set(self.fields) - used:
+            raise TemplateError(f"Template {name} declares unused fields: {', '.join(sorted(set(self.fields) - used))}")
+        if set(trim_first) - set(self.fields):
+            raise TemplateError(f"Template {name}: trim_first names undeclared fields")
+        self.trim_first = tuple(trim_first)
+        self.required = tuple(field for field, spec in self.fields.items() if spec.get('required'))
+        self._indented = {}
+
+    def fields_from(self, data):
+        """Pick this template's fields out of a request body, applying defaults."""
+        missing = [field for field in self.required if not data.get(field)]
+        if missing:
+            raise TemplateError(f"Missing required data: {', '.join(missing)}")
+        values = {}
+        for field, spec in self.fields.items():
+            value = data.get(field)
+            values[field] = spec.get('default', '') if value is None else str(value)
+        return values
+
+    def format(self, **fields):
+        return ''.join(text if literal else fields[text] for literal, text in self.segments)
+
+    def indented(self, prefix):
+        """This template laid out like an f-string indented by prefix in the source."""
+        if prefix not in self._indented:
+            lines = '\n'.join(prefix + line if line else '' for line in self.text.split('\n'))
+            self._indented[prefix] = PromptTemplate(self.name, f"\n{lines}\n{prefix}", self.fields, self.trim_first)
+        return self._indented[prefix]
+
+
+def _compile(name, spec):
+    text = spec['template']
+    if isinstance(text, list):
+        text = '\n'.join(text)
+    return PromptTemplate(name, text, spec.get('fields'), spec.get('trim_first', ()))
+
+
+class TemplateSet:
+    def __init__(self, config):
+        self.kinds = {}
+        for kind, kind_config in config.items():
+            if 'default' not in kind_config:
+                raise TemplateError(f"Prompt kind {kind!r} has no default template")
+            firms = {}
+            for firm, firm_spec in kind_config.get('firms', {}).items():
+                questions = {
+                    normalize_question(question): _compile(f"{kind}/{firm}/{question}", question_spec)
+                    for question, question_spec in firm_spec.get('questions', {}).items()
+                }
+                firms[firm.casefold()] = (_compile(f"{kind}/{firm}", firm_spec), questions)
+            self.kinds[kind] = (_compile(f"{kind}/default", kind_config['default']), firms)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as file:
+            return cls(json.load(file))
+
+    def lookup(self, kind, firm=None, question=None):
+        """The most specific template for a firm and question, else the default."""
+        default, firms = self.kinds[kind]
+        if not firm or firm.casefold() not in firms:
+            return default
+        firm_template, questions = firms[firm.casefold()]
+        return questions.get(normalize_question(question), firm_template)
+
+    def __iter__(self):
+        for default, firms in self.kinds.values():
+            yield default
+            for firm_template, questions in firms.values():
+                yield firm_template
+                yield from questions.values()
+
+
+templates = TemplateSet.load(PROMPT_TEMPLATES_PATH)
+
+
+if __name__ == "__main__":
+    for template in templates:
+        print(f"{template.name}: {', '.join(template.fields)}")
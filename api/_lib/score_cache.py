@@ -0,0 +1,106 @@
+from collections import OrderedDict
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def cache_key(model, role_description, prompt, content, temperature):
+    payload = json.dumps([model, role_description, prompt, content, temperature], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ScoreCache:
+    """LRU/TTL cache of section scores, optionally backed by SQLite.
+
+    The in-memory layer answers repeat submissions without touching disk.
+    When a path is given, entries are also written to SQLite so they survive
+    a restart and can be shared by processes on the same machine.
+    """
+
+    def __init__(self, max_entries=1024, ttl_seconds=3600, path=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS score_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)'
+            )
+            self._db.commit()
+
+    def _expired(self, created_at, now):
+        return self.ttl_seconds is not None and now - created_at > self.ttl_seconds
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                created_at, value = entry
+                if not self._expired(created_at, now):
+                    self._entries.move_to_end(key)
+                    return value
+                del self._entries[key]
+
+            if self._db is None:
+                return None
+            row = self._db.execute('SELECT value, created_at FROM score_cache WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            if self._expired(row[1], now):
+                self._db.execute('DELETE FROM score_cache WHERE key = ?', (key,))
+                self._db.commit()
+                return None
+            value = json.loads(row[0])
+            self._remember(key, row[1], value)
+            return value
+
+    def set(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, value)
+            if self._db is not None:
+                self._db.execute(
+                    'INSERT OR REPLACE INTO score_cache (key, value, created_at) VALUES (?, ?, ?)',
+                    (key, json.dumps(value), now),
+                )
+                self._db.commit()
+
+    def _remember(self, key, created_at, value):
+        self._entries[key] = (created_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute('DELETE FROM score_cache')
+                self._db.commit()
+
+
+def _cache_from_env():
+    if os.environ.get('SCORE_CACHE_DISABLED') == '1':
+        return None
+    path = os.environ.get('SCORE_CACHE_PATH')
+    try:
+        return ScoreCache(
+            max_entries=int(os.environ.get('SCORE_CACHE_MAX_ENTRIES', '1024')),
+            ttl_seconds=float(os.environ.get('SCORE_CACHE_TTL_SECONDS', '3600')),
+            path=path,
+        )
+    except sqlite3.Error as e:
+        logger.error(f"Could not open score cache at {path}, using memory only: {str(e)}")
+        return ScoreCache()
+
+
+score_cache = _cache_from_env()
@@ -0,0 +1,56 @@
+"""JSON schema for section scores and a compiled validator for it.
+
+The schema sent to the model uses only the keywords strict structured
+outputs accept; the 0-100 bound is enforced by the validator instead. Extra
+keys are only ruled out by the schema sent to the model: replies on the
+plain-text path may carry them, as they always could, and still validate.
+fastjsonschema compiles the validator to plain Python when it is installed;
+otherwise an equivalent hand-written check is used.
+"""
+try:
+    import fastjsonschema
+except ImportError:
+    fastjsonschema = None
+
+SCORE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "score": {"type": "number"},
+        "justification": {"type": "string"},
+    },
+    "required": ["score", "justification"],
+    "additionalProperties": False,
+}
+
+_BOUNDED_SCORE_SCHEMA = {
+    **SCORE_SCHEMA,
+    "additionalProperties": True,
+    "properties": {
+        **SCORE_SCHEMA["properties"],
+        "score": {"type": "number", "minimum": 0, "maximum": 100},
+    },
+}
+
+
+def response_format(name, schema):
+    return {"type": "json_schema", "json_schema": {"name": name, "strict": True, "schema": schema}}
+
+
+SCORE_RESPONSE_FORMAT = response_format("section_score", SCORE_SCHEMA)
+
+
+def _check_score(result):
+    if not isinstance(result, dict):
+        raise ValueError("data must be object")
+    score = result.get("score")
+    if isinstance(score, bool) or not isinstance(score, (int, float)):
+        raise ValueError("data.score must be number")
+    if not 0 <= score <= 100:
+        raise ValueError("data.score must be between 0 and 100")
+    if not isinstance(result.get("justification"), str):
+        raise ValueError("data.justification must be string")
+    return result
+
+
+# Raises a ValueError subclass on invalid input, like _check_score.
+validate_score = fastjsonschema.compile(_BOUNDED_SCORE_SCHEMA) if fastjsonschema else _check_score
@@ -0,0 +1,365 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import NamedTuple
+import os
+import json
+import logging
+import time
+
+from openai import BadRequestError
+
+from _lib import metrics
+from _lib.model_router import router
+from _lib.openai_client import chat_completion
+from _lib.score_schema import SCORE_RESPONSE_FORMAT, SCORE_SCHEMA, response_format, validate_score
+from _lib.score_cache import cache_key, score_cache
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on how long a section may run once it has a pool thread.
+SCORING_DEADLINE_SECONDS = float(os.environ.get('SCORING_DEADLINE_SECONDS', '25'))
+
+# Upper bound on a whole POST, time spent waiting for pool threads included.
+SCORING_REQUEST_DEADLINE_SECONDS = float(
+    os.environ.get('SCORING_REQUEST_DEADLINE_SECONDS', str(2 * SCORING_DEADLINE_SECONDS))
+)
+
+# How many times a section is re-requested when its reply does not parse or
+# validate. Only the failing section is retried, never the whole request.
+SCORING_PARSE_RETRIES = int(os.environ.get('SCORING_PARSE_RETRIES', '1'))
+
+# "json_schema" asks for schema-constrained output; "text" is the old
+# free-form reply parsed by parse_openai_response.
+SCORING_OUTPUT_MODE = os.environ.get('SCORING_OUTPUT_MODE', 'json_schema')
+
+# "sections" makes one completion per section; "combined" scores every
+# uncached section in a single structured completion. Requests can override
+# it with "scoring_mode".
+SCORING_MODE = os.environ.get('SCORING_MODE', 'sections')
+
+# Models that rejected response_format; they get plain text requests.
+_models_without_schema = set()
+
+# Shared across requests so a warm process does not pay thread start-up per
+# POST. Every app-server worker may be scoring three sections at once, so the
+# default leaves room for all of them; threads are only started as needed.
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('SCORING_MAX_WORKERS', str(3 * int(os.environ.get('APP_SERVER_WORKERS', '64'))))),
+    thread_name_prefix='scoring',
+)
+
+
+class Section(NamedTuple):
+    key: str
+    label: str
+    role_description: str
+    temperature: float = 0.4
+
+
+SECTIONS = (
+    Section('workexp', 'Work Experience', 'evaluating work experience for job applications'),
+    Section('education', 'Education', 'evaluating educational qualifications for job applications'),
+    Section('opentext', 'Open Text', 'analyzing open-ended responses in job applications'),
+)
+
+
+class ScoreRequest:
+    def __init__(self, data):
+        self.workexp_content = data.get('workexp_content', '')
+        self.workexp_model = data.get('workexp_model', '')
+        self.workexp_prompt = data.get('workexp_prompt', '')
+        self.opentext_content = data.get('opentext_content', '')
+        self.opentext_model = data.get('opentext_model', '')
+        self.opentext_prompt = data.get('opentext_prompt', '')
+        self.education_content = data.get('education_content', '')
+        self.education_model = data.get('education_model', '')
+        self.education_prompt = data.get('education_prompt', '')
+        self.scoring_mode = data.get('scoring_mode') or SCORING_MODE
+
+    def section_inputs(self, key):
+        return (
+            getattr(self, f'{key}_content'),
+            getattr(self, f'{key}_model'),
+            getattr(self, f'{key}_prompt'),
+        )
+
+
+def parse_openai_response(response_content):
+    try:
+        # First, try to parse the entire response as JSON
+        return json.loads(response_content)
+    except json.JSONDecodeError:
+        # If that fails, try to extract JSON from the response
+        try:
+            json_start = response_content.index('{')
+            json_end = response_content.rindex('}') + 1
+            json_str = response_content[json_start:json_end]
+            return json.loads(json_str)
+        except (ValueError, json.JSONDecodeError):
+            # If JSON extraction fails, return an error
+            return {"error": "Failed to parse response", "raw_response": response_content}
+
+
+def routed_completion(model, deadline=None, **kwargs):
+    """chat_completion through the model router's fallbacks and hedging.
+
+    No call is made once the deadline (a time.monotonic() value) has passed,
+    and calls made before it are cut off at it.
+    """
+    def call(candidate, max_retries):
+        if deadline is not None and time.monotonic() >= deadline:
+            raise TimeoutError("scoring deadline passed")
+        return chat_completion(model=candidate, max_retries=max_retries, deadline=deadline, **kwargs)
+    return router.call('calculate_scores', model, call)
+
+
+def request_score(model, messages, temperature, max_tokens=250, response_format=SCORE_RESPONSE_FORMAT, deadline=None):
+    """Return the raw reply text, with structured output where the model supports it."""
+    kwargs = dict(messages=messages, temperature=temperature, max_tokens=max_tokens, n=1, stop=None, deadline=deadline)
+    if SCORING_OUTPUT_MODE == 'json_schema' and model not in _models_without_schema:
+        try:
+            response = routed_completion(model, response_format=response_format, **kwargs)
+            return response.choices[0].message.content.strip()
+        except BadRequestError as e:
+            if 'response_format' not in str(e):
+                raise
+            logger.warning(f"{model} does not support structured output, falling back to text: {str(e)}")
+            _models_without_schema.add(model)
+    response = routed_completion(model, **kwargs)
+    return response.choices[0].message.content.strip()
+
+
+def parse_score(raw_response):
+    with metrics.timed('request_stage_seconds', endpoint='scoring', stage='json_parse'):
+        parsed_response = parse_openai_response(raw_response)
+        if 'error' in parsed_response:
+            return parsed_response
+        try:
+            return validate_score(parsed_response)
+        except ValueError as e:
+            return {"error": f"Invalid score: {str(e)}", "raw_response": raw_response}
+
+
+def calculate_score(content, model, prompt, role_description, temperature=0.4, deadline=None):
+    try:
+        logger.info(f"Calculating score for {role_description}")
+        logger.debug(f"Model: {model}")
+        logger.debug(f"Prompt: {prompt}")
+        logger.debug(f"Content: {content}")
+
+        messages = [
+            {"role": "system", "content": f"You are an AI expert in {role_description}. Your task is to rate the given content and provide a justification for your rating. {prompt} Provide your response in JSON format with the following structure: {{\"score\": (a number between 0 and 100), \"justification\": \"Your explanation here, in STRICTLY 30 words or less\"}}"},
+            {"role": "user", "content": content}
+        ]
+        for attempt in range(SCORING_PARSE_RETRIES + 1):
+            raw_response = request_score(model, messages, temperature, deadline=deadline)
+            logger.debug(f"Raw API response: {raw_response}")
+
+            parsed_response = parse_score(raw_response)
+            if 'error' not in parsed_response or (deadline is not None and time.monotonic() >= deadline):
+                break
+            logger.warning(f"Unusable score reply for {role_description} (attempt {attempt + 1}): {parsed_response['error']}")
+
+        if 'error' in parsed_response:
+            logger.error(f"Error parsing API response: {parsed_response['error']}")
+            return {"error": f"Error parsing API response: {parsed_response['error']}", "raw_response": raw_response}
+
+        logger.info(f"Score calculated successfully for {role_description}")
+        return parsed_response
+    except Exception as e:
+        logger.error(f"Error calculating score: {str(e)}")
+        return {"error": f"Error calculating score: {str(e)}"}
+
+
+def calculate_combined_scores(score_request, sections=SECTIONS, deadline=None):
+    """Score several sections with one completion; returns {section key: result}.
+
+    Every section must use the same model. A section whose part of the reply
+    is missing or invalid comes back as an error result so the caller can
+    re-score just that section.
+    """
+    model = score_request.section_inputs(sections[0].key)[1]
+    instructions = []
+    contents = []
+    for section in sections:
+        content, _, prompt = score_request.section_inputs(section.key)
+        instructions.append(f"- \"{section.key}\" ({section.label}): act as an expert in {section.role_description}. {prompt}")
+        contents.append(f"[{section.key}] {section.label}:\n{content}")
+    messages = [
+        {"role": "system", "content": "You are an AI expert in evaluating job applications. Your task is to rate each section of the application separately and provide a justification for each rating.\n" + "\n".join(instructions) + "\nProvide your response in JSON format with one entry per section key, each with the following structure: {\"score\": (a number between 0 and 100), \"justification\": \"Your explanation here, in STRICTLY 30 words or less\"}"},
+        {"role": "user", "content": "\n\n".join(contents)}
+    ]
+    schema = {
+        "type": "object",
+        "properties": {section.key: SCORE_SCHEMA for section in sections},
+        "required": [section.key for section in sections],
+        "additionalProperties": False,
+    }
+    temperature = sum(section.temperature for section in sections) / len(sections)
+
+    try:
+        logger.info(f"Calculating combined score for {', '.join(section.key for section in sections)}")
+        raw_response = request_score(
+            model, messages, temperature,
+            max_tokens=250 * len(sections),
+            response_format=response_format("application_scores", schema),
+            deadline=deadline,
+        )
+    except Exception as e:
+        logger.error(f"Error calculating combined score: {str(e)}")
+        return {section.key: {"error": f"Error calculating score: {str(e)}"} for section in sections}
+
+    results = {}
+    with metrics.timed('request_stage_seconds', endpoint='scoring', stage='json_parse'):
+        parsed_response = parse_openai_response(raw_response)
+        for section in sections:
+            if 'error' in parsed_response:
+                results[section.key] = {"error": f"Error parsing API response: {parsed_response['error']}", "raw_response": raw_response}
+                continue
+            try:
+                results[section.key] = validate_score(parsed_response.get(section.key))
+            except ValueError as e:
+                results[section.key] = {"error": f"Error parsing API response: Invalid score: {str(e)}", "raw_response": raw_response}
+    return results
+
+
+def _submit(fn, budget, request_ends, *args):
+    """Run fn(*args, deadline=...) on the scoring pool; returns (future, clock).
+
+    fn's deadline is budget seconds after a pool thread picks it up, but no
+    later than request_ends; clock["started"] and clock["deadline"] record
+    both once it runs.
+    """
+    clock = {}
+
+    def run():
+        started = time.monotonic()
+        clock["deadline"] = min(started + budget, request_ends)
+        clock["started"] = started
+        return fn(*args, deadline=clock["deadline"])
+    return _executor.submit(run), clock
+
+
+def _wait_for(jobs, request_ends):
+    """Wait until every (future, clock) job is done or past its deadline.
+
+    Time a job spends queued for a pool thread does not count against its
+    own deadline, only against request_ends, so a busy process answers more
+    slowly instead of timing sections out, up to the request's limit.
+    """
+    while True:
+        now = time.monotonic()
+        pending = [(future, clock) for future, clock in jobs if not future.done()]
+        ends = [clock.get("deadline", request_ends) for _, clock in pending]
+        ends = [end for end in ends if end > now]
+        if not ends:
+            return
+        wait([future for future, _ in pending], timeout=min(ends) - now, return_when=FIRST_COMPLETED)
+
+
+def score_sections(score_request, sections=SECTIONS, deadline=None, cache=score_cache, request_deadline=None):
+    """Score every section concurrently.
+
+    Returns ({section key: result}, {"hits": n, "misses": n}). Sections whose
+    (model, role, prompt, content, temperature) were scored before are served
+    from the cache; the rest are submitted at once, so a request costs roughly
+    the slowest model round-trip instead of the sum of all three. In combined
+    mode the uncached sections share one completion instead, and only those it
+    fails to score are re-requested individually, in what is left of its
+    deadline. A section gets `deadline` seconds once it is running and the
+    whole request `request_deadline`; sections that miss either come back as
+    an error result in the same shape calculate_score uses for its own
+    failures, and their model calls are cut off at the deadline.
+    """
+    if deadline is None:
+        deadline = SCORING_DEADLINE_SECONDS
+    if request_deadline is None:
+        request_deadline = SCORING_REQUEST_DEADLINE_SECONDS
+    request_started = time.monotonic()
+    request_ends = request_started + request_deadline
+
+    results = {}
+    keys = {}
+    pending = []
+    for section in sections:
+        content, model, prompt = score_request.section_inputs(section.key)
+        if cache is not None:
+            keys[section.key] = cache_key(model, section.role_description, prompt, content, section.temperature)
+            cached = cache.get(keys[section.key])
+            if cached is not None:
+                results[section.key] = cached
+                continue
+        pending.append(section)
+
+    cache_stats = {"hits": len(results), "misses": len(pending)}
+
+    def store(key, result):
+        results[key] = result
+        if cache is not None and 'error' not in result:
+            cache.set(keys[key], result)
+
+    def timed_out(key, clock):
+        # The time the section actually had: its own budget once running,
+        # or the time it waited for a thread before the request ran out.
+        if "started" in clock:
+            allowed = clock["deadline"] - clock["started"]
+        else:
+            allowed = time.monotonic() - request_started
+        logger.error(f"Scoring {key} did not finish within {allowed:.1f}s")
+        return {"error": f"Error calculating score: timed out after {allowed:.1f}s"}
+
+    budget = deadline
+    models = {score_request.section_inputs(section.key)[1] for section in pending}
+    if score_request.scoring_mode == 'combined' and len(pending) > 1 and len(models) == 1:
+        combined, clock = _submit(calculate_combined_scores, deadline, request_ends, score_request, pending)
+        _wait_for([(combined, clock)], request_ends)
+        if not combined.done():
+            combined.cancel()
+            error = timed_out('combined', clock)
+            for section in pending:
+                results[section.key] = dict(error)
+            return results, cache_stats
+        combined_results = combined.result()
+        retry = []
+        for section in pending:
+            if 'error' in combined_results[section.key]:
+                logger.warning(f"Combined scoring failed for {section.key}, re-scoring it alone: {combined_results[section.key]['error']}")
+                retry.append(section)
+            else:
+                store(section.key, combined_results[section.key])
+        pending = retry
+        budget = clock["deadline"] - time.monotonic()
+        if pending and budget <= 0:
+            allowed = clock["deadline"] - clock["started"]
+            logger.error(f"No time left to re-score {', '.join(section.key for section in pending)} after combined scoring")
+            for section in pending:
+                results[section.key] = {"error": f"Error calculating score: timed out after {allowed:.1f}s"}
+            return results, cache_stats
+
+    jobs = {}
+    for section in pending:
+        content, model, prompt = score_request.section_inputs(section.key)
+        jobs[section.key] = _submit(
+            calculate_score, budget, request_ends,
+            content, model, prompt, section.role_description, section.temperature,
+        )
+
+    _wait_for(jobs.values(), request_ends)
+
+    for key, (future, clock) in jobs.items():
+        if future.done():
+            store(key, future.result())
+        else:
+            # A section that has not started is dropped here; one that is
+            # running stops at its deadline, which its model call honors.
+            future.cancel()
+            results[key] = timed_out(key, clock)
+    return results, cache_stats
+
+
+def collect_errors(results, sections=SECTIONS):
+    errors = []
+    for section in sections:
+        result = results[section.key]
+        if 'error' in result:
+            errors.append(f"{section.label}: {result['error']}")
+    return errors
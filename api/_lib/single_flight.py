@@ -0,0 +1,111 @@
+"""Coalesce identical in-flight requests into one model call.
+
+Double-clicks and frontend retries send byte-for-byte identical bodies a few
+milliseconds apart. The first request for a key runs the route; duplicates
+that arrive while it is running wait for its result (or its exception)
+instead of making their own call, and duplicates that arrive within
+SINGLE_FLIGHT_TTL_SECONDS of a successful result get that result directly.
+"""
+from collections import OrderedDict
+import functools
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from _lib import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def request_key(name, data):
+    """Hash of a route name and its JSON body, independent of key order."""
+    payload = json.dumps([name, data], sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self, ttl_seconds=10, max_entries=1024):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._calls = {}
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, *args, **kwargs):
+        """Return (result, outcome) where outcome is "leader", "joined" or "cached"."""
+        with self._lock:
+            entry = self._results.get(key)
+            if entry is not None:
+                if time.monotonic() - entry[0] <= self.ttl_seconds:
+                    return entry[1], 'cached'
+                del self._results[key]
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, 'joined'
+
+        try:
+            call.result = fn(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                if call.error is None and self.ttl_seconds > 0:
+                    self._results[key] = (time.monotonic(), call.result)
+                    while len(self._results) > self.max_entries:
+                        self._results.popitem(last=False)
+            call.done.set()
+        return call.result, 'leader'
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+
+
+SINGLE_FLIGHT_DISABLED = os.environ.get('SINGLE_FLIGHT_DISABLED') == '1'
+
+flights = SingleFlight(
+    ttl_seconds=float(os.environ.get('SINGLE_FLIGHT_TTL_SECONDS', '10')),
+    max_entries=int(os.environ.get('SINGLE_FLIGHT_MAX_ENTRIES', '1024')),
+)
+
+
+def coalesced(name, flight=flights):
+    """Decorate a route so identical bodies share one execution.
+
+    The key covers the body only, so this is for routes whose result does not
+    depend on the request headers.
+    """
+    def decorator(route):
+        if SINGLE_FLIGHT_DISABLED:
+            return route
+
+        @functools.wraps(route)
+        def wrapper(data, headers=None):
+            result, outcome = flight.do(request_key(name, data), route, data, headers)
+            if outcome != 'leader':
+                logger.info(f"Served duplicate {name} request from a {outcome} result")
+            metrics.count('single_flight_total', route=name, outcome=outcome)
+            return result
+        return wrapper
+    return decorator
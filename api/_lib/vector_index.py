@@ -0,0 +1,139 @@
+"""Exact top-k similarity search over example embeddings.
+
+Embeddings live in one contiguous float32 matrix, so a query is a single
+matrix-vector product plus argpartition instead of a Python loop over rows.
+An index is saved as <prefix>.npy (the matrix) and <prefix>.json (ids and
+per-row metadata), and can be memory-mapped back in.
+
+    python api/_lib/vector_index.py build goodwin_jsonl.jsonl josh.jsonl --out examples
+
+Pass --ann-lists to also cluster the rows for approximate search (see
+ivf_index.py).
+"""
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from _lib.corpus import open_text_question, read_jsonl, record_messages, split_application
+
+
+class VectorIndex:
+    def __init__(self, dim, capacity=1024):
+        self.dim = dim
+        self._matrix = np.empty((capacity, dim), dtype=np.float32)
+        self._size = 0
+        self.ids = []
+        self.metadata = []
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def matrix(self):
+        return self._matrix[:self._size]
+
+    def add(self, ids, vectors, metadata=None):
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        if len(ids) != len(vectors):
+            raise ValueError(f"Got {len(ids)} ids for {len(vectors)} vectors")
+        needed = self._size + len(vectors)
+        if needed > len(self._matrix) or not self._matrix.flags.writeable:
+            # Grow geometrically; this also copies a memory-mapped (read-only)
+            # matrix into memory the first time rows are inserted after load().
+            grown = np.empty((max(needed, 2 * len(self._matrix), 1024), self.dim), dtype=np.float32)
+            grown[:self._size] = self._matrix[:self._size]
+            self._matrix = grown
+        self._matrix[self._size:needed] = vectors
+        self._size = needed
+        self.ids.extend(ids)
+        self.metadata.extend(metadata if metadata is not None else [{} for _ in ids])
+
+    def search(self, query, k=10):
+        """Return the k best rows as [(id, similarity, metadata)], best first."""
+        if self._size == 0:
+            return []
+        scores = self.matrix @ np.asarray(query, dtype=np.float32)
+        k = min(k, self._size)
+        top = np.argpartition(-scores, k - 1)[:k] if k < self._size else np.arange(self._size)
+        top = top[np.argsort(-scores[top])]
+        return [(self.ids[i], float(scores[i]), self.metadata[i]) for i in top]
+
+    def save(self, prefix):
+        np.save(f'{prefix}.npy', self.matrix)
+        with open(f'{prefix}.json', 'w', encoding='utf-8') as file:
+            json.dump({'ids': self.ids, 'metadata': self.metadata}, file)
+
+    @classmethod
+    def load(cls, prefix, mmap=True):
+        matrix = np.load(f'{prefix}.npy', mmap_mode='r' if mmap else None)
+        with open(f'{prefix}.json', 'r', encoding='utf-8') as file:
+            sidecar = json.load(file)
+        index = cls(matrix.shape[1], capacity=0)
+        index._matrix = matrix
+        index._size = len(matrix)
+        index.ids = sidecar['ids']
+        index.metadata = sidecar['metadata']
+        return index
+
+
+def corpus_examples(paths):
+    """Yield (id, application text, metadata) for each record of the corpora."""
+    for path in paths:
+        name = os.path.splitext(os.path.basename(path))[0]
+        for line_number, record in read_jsonl(path):
+            user_messages = record_messages(record, 'user')
+            if not user_messages:
+                continue
+            sections = split_application(user_messages[0])
+            application_text = sections.get('opentext') or user_messages[0]
+            feedback = record_messages(record, 'assistant')
+            yield f'{name}:{line_number}', application_text, {
+                'application_text': application_text,
+                'question': open_text_question(user_messages[0]),
+                'decision': sections.get('decision', ''),
+                'feedback': feedback[0] if feedback else '',
+            }
+
+
+def build(paths, prefix, embed, batch_size=64):
+    examples = list(corpus_examples(paths))
+    index = None
+    for start in range(0, len(examples), batch_size):
+        batch = examples[start:start + batch_size]
+        vectors = np.asarray(embed([text for _, text, _ in batch]), dtype=np.float32)
+        if index is None:
+            index = VectorIndex(vectors.shape[1], capacity=len(examples))
+        index.add([example_id for example_id, _, _ in batch], vectors, [metadata for _, _, metadata in batch])
+    if index is None:
+        raise ValueError("No examples found in the corpus")
+    index.save(prefix)
+    return index
+
+
+def main(argv=None):
+    from _lib.embeddings import embed_texts
+
+    parser = argparse.ArgumentParser(description="Build the example vector index.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build_parser = subparsers.add_parser('build', help="Embed a JSONL corpus and save the index")
+    build_parser.add_argument('corpus', nargs='+')
+    build_parser.add_argument('--out', required=True, help="Output prefix for the .npy/.json pair")
+    build_parser.add_argument('--ann-lists', type=int, default=0, help="Also write an IVF index with this many lists")
+    args = parser.parse_args(argv)
+
+    index = build(args.corpus, args.out, embed_texts)
+    print(f"Indexed {len(index)} examples ({index.dim} dimensions) into {args.out}.npy")
+    if args.ann_lists:
+        from _lib.ivf_index import IVFIndex
+        IVFIndex.build(index, n_lists=args.ann_lists).save(args.out)
+        print(f"Clustered into {args.ann_lists} IVF lists in {args.out}.ivf.npz")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
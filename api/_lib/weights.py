@@ -0,0 +1,116 @@
+"""Weighted composite scores from per-firm weight profiles.
+
+Profiles live in weight_profiles.json (or WEIGHT_PROFILES_PATH) and are
+re-read when the file changes:
+
+    {"default": {"workexp": 0.2, "education": 0.2, "opentext": 0.6},
+     "profiles": {"<firm name or id>": {...}}}
+
+A request or stored row names its firm, by id or name; firms without a
+profile use the default. Whole cohorts are re-weighted in one NumPy pass,
+without calling the model again:
+
+    python api/_lib/weights.py rescore scores.jsonl reranked.jsonl --profile Goodwin
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from _lib.corpus import read_jsonl
+
+SECTION_KEYS = ('workexp', 'education', 'opentext')
+
+WEIGHT_PROFILES_PATH = os.environ.get(
+    'WEIGHT_PROFILES_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'weight_profiles.json')
+)
+
+_lock = threading.Lock()
+_loaded = {'mtime': None, 'default': None, 'profiles': {}}
+
+
+def _validate(name, weights):
+    if set(weights) != set(SECTION_KEYS):
+        raise ValueError(f"Weight profile {name!r} must have exactly {', '.join(SECTION_KEYS)}")
+    if any(not isinstance(value, (int, float)) or value < 0 for value in weights.values()):
+        raise ValueError(f"Weight profile {name!r} has a negative or non-numeric weight")
+    return {key: float(weights[key]) for key in SECTION_KEYS}
+
+
+def _profiles():
+    mtime = os.stat(WEIGHT_PROFILES_PATH).st_mtime
+    with _lock:
+        if mtime != _loaded['mtime']:
+            with open(WEIGHT_PROFILES_PATH, 'r', encoding='utf-8') as file:
+                config = json.load(file)
+            _loaded['default'] = _validate('default', config['default'])
+            _loaded['profiles'] = {
+                str(name): _validate(name, weights) for name, weights in config.get('profiles', {}).items()
+            }
+            _loaded['mtime'] = mtime
+        return _loaded['default'], _loaded['profiles']
+
+
+def weights_for(*names):
+    """The profile of the first name (firm id, firm name, ...) that has one, else the default."""
+    default, profiles = _profiles()
+    for name in names:
+        if name is not None and str(name) in profiles:
+            return profiles[str(name)]
+    return default
+
+
+def weighted_score(results, weights):
+    return sum(results[key].get('score', 0) * weights[key] for key in SECTION_KEYS)
+
+
+def score_matrix(rows):
+    """Stack the section scores of stored rows into an (n, 3) float array."""
+    import numpy as np
+
+    return np.array(
+        [[row.get(key, {}).get('score', 0) or 0 for key in SECTION_KEYS] for row in rows], dtype=np.float64
+    ).reshape(-1, len(SECTION_KEYS))
+
+
+def composite_scores(matrix, weights):
+    import numpy as np
+
+    return matrix @ np.array([weights[key] for key in SECTION_KEYS], dtype=np.float64)
+
+
+def rerank(rows, weights):
+    """Re-weight stored rows and return them best first, with a rank."""
+    import numpy as np
+
+    composite = composite_scores(score_matrix(rows), weights)
+    order = np.argsort(-composite, kind='stable')
+    reranked = []
+    for rank, i in enumerate(order, start=1):
+        reranked.append({**rows[i], 'weighted_score': float(composite[i]), 'rank': rank})
+    return reranked
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recompute weighted scores for a stored cohort.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    rescore = subparsers.add_parser('rescore', help="Re-weight a JSONL of calculate_scores results")
+    rescore.add_argument('input', help="Rows with workexp/education/opentext results, e.g. batch_scoring output")
+    rescore.add_argument('output')
+    rescore.add_argument('--profile', help="Weight profile (firm); defaults to the default profile")
+    args = parser.parse_args(argv)
+
+    rows = [row for _, row in read_jsonl(args.input) if 'error' not in row]
+    weights = weights_for(args.profile)
+    with open(args.output, 'w', encoding='utf-8') as output:
+        for row in rerank(rows, weights):
+            output.write(json.dumps(row) + '\n')
+    print(f"Re-ranked {len(rows)} applications with weights {weights}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,16 +1,17 @@
 import os
-import json
-from openai import OpenAI
+import sys
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 from pydantic import BaseModel
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from _lib.scoring import ScoreRequest as SectionInputs, Section, score_sections
+from _lib.weights import weighted_score, weights_for
+
 app = Flask(__name__)
 CORS(app, resources={r"/*": {"origins": "http://localhost:3000", "methods": ["GET", "POST", "OPTIONS"]}})
 
-# Initialize OpenAI client
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
 class ScoreRequest(BaseModel):
     workexp_content: str
     workexp_model: str
@@ -22,59 +23,12 @@ class ScoreRequest(BaseModel):
     education_model: str
     education_prompt: str
 
-def calculate_workexp_score(content, model, prompt):
-    try:
-        response = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": f"You are an AI expert in evaluating work experience for job applications. Your task is to rate the given work experience and provide a justification for your rating. {prompt} Provide your response in JSON format with the following structure: {{\"score\": (a number between 0 and 100), \"justification\": \"Your explanation here\"}}"},
-                {"role": "user", "content": content}
-            ],
-            temperature=0.3,
-            max_tokens=250,
-            n=1,
-            stop=None,
-        )
-        return json.loads(response.choices[0].message.content.strip())
-    except Exception as e:
-        print(f"Error calculating work experience score: {str(e)}")
-        return {"error": f"Error calculating work experience score: {str(e)}"}, 500
-
-def calculate_education_score(content, model, prompt):
-    try:
-        response = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": f"You are an AI expert in evaluating educational qualifications for job applications. Your task is to rate the given education details and provide a justification for your rating. {prompt} Provide your response in JSON format with the following structure: {{\"score\": (a number between 0 and 100), \"justification\": \"Your explanation here\"}}"},
-                {"role": "user", "content": content}
-            ],
-            temperature=0.5,
-            max_tokens=250,
-            n=1,
-            stop=None,
-        )
-        return json.loads(response.choices[0].message.content.strip())
-    except Exception as e:
-        print(f"Error calculating education score: {str(e)}")
-        return {"error": f"Error calculating education score: {str(e)}"}, 500
-
-def calculate_opentext_score(content, model, prompt):
-    try:
-        response = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": f"You are an AI expert in analyzing open-ended responses in job applications. Your task is to rate the given response and provide a justification for your rating. Consider factors such as clarity, relevance, and depth of insight. {prompt} Provide your response in JSON format with the following structure: {{\"score\": (a number between 0 and 100), \"justification\": \"Your explanation here\"}}"},
-                {"role": "user", "content": content}
-            ],
-            temperature=0.4,
-            max_tokens=250,
-            n=1,
-            stop=None,
-        )
-        return json.loads(response.choices[0].message.content.strip())
-    except Exception as e:
-        print(f"Error calculating open text score: {str(e)}")
-        return {"error": f"Error calculating open text score: {str(e)}"}, 500
+# Same engine as index.py, with the temperatures this server has always used.
+LOCAL_SECTIONS = (
+    Section('workexp', 'Work Experience', 'evaluating work experience for job applications', temperature=0.3),
+    Section('education', 'Education', 'evaluating educational qualifications for job applications', temperature=0.5),
+    Section('opentext', 'Open Text', 'analyzing open-ended responses in job applications', temperature=0.4),
+)
 
 @app.route("/calculate_score", methods=["POST", "OPTIONS"])
 def calculate_scores():
@@ -82,24 +36,24 @@ def calculate_scores():
         return "", 200
     
     data = request.json
-    workexp_result = calculate_workexp_score(data['workexp_content'], data['workexp_model'], data['workexp_prompt'])
-    education_result = calculate_education_score(data['education_content'], data['education_model'], data['education_prompt'])
-    opentext_result = calculate_opentext_score(data['opentext_content'], data['opentext_model'], data['opentext_prompt'])
+    results, cache_stats = score_sections(SectionInputs(data), sections=LOCAL_SECTIONS)
+    workexp_result = results['workexp']
+    education_result = results['education']
+    opentext_result = results['opentext']
 
-    if isinstance(workexp_result, tuple) or isinstance(education_result, tuple) or isinstance(opentext_result, tuple):
+    if any('error' in result for result in results.values()):
+        print(f"Error calculating scores: {results}")
         return jsonify({"error": "An error occurred during score calculation"}), 500
 
-    workexp_score = workexp_result['score']
-    education_score = education_result['score']
-    opentext_score = opentext_result['score']
-
-    weighted_score = (workexp_score * 0.4) + (education_score * 0.3) + (opentext_score * 0.3)
+    # Same weight profiles as index.py, so both servers agree on a firm's score.
+    weights = weights_for(data.get('firm_id'), data.get('firm'))
 
     return jsonify({
         "workexp": workexp_result,
         "education": education_result,
         "opentext": opentext_result,
-        "weighted_score": weighted_score
+        "weighted_score": weighted_score(results, weights),
+        "metadata": {"cache": cache_stats}
     })
 
 if __name__ == "__main__":
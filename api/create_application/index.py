@@ -1,111 +1,139 @@
-import json
+import logging
 import os
-from openai import OpenAI
-from http.server import BaseHTTPRequestHandler
-
-client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
-
-class handler(BaseHTTPRequestHandler):
-    def set_CORS_headers(self):
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type,Authorization')
-        self.send_header('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
-    
-    def do_OPTIONS(self):
-        self.send_response(200)
-        self.set_CORS_headers()
-        self.end_headers()
-
-    def do_POST(self):
-        content_length = int(self.headers['Content-Length'])
-        post_data = self.rfile.read(content_length)
-        data = json.loads(post_data.decode('utf-8'))
-
-        print("Received data:", json.dumps(data, indent=2))  # Log received data
-
-        firmName = data.get('firmName')
-        question = data.get('question')
-        system_prompt = data.get('system_prompt')
-        model = data.get('model')
-        importedDraft = data.get('importedDraft', '')  # Get the imported draft, default to empty string
-
-        if not all([firmName, question, system_prompt, model]):
-            self.send_error_response(400, f"Missing required data. firmName: {firmName}, question: {question}, system_prompt: {system_prompt}, model: {model}")
-            return
-
-        try:
-            if firmName == "Jones Day":
-                prompt = f"""
-                Generate a draft application for Jones Day addressing the following question:
-                "{question}"
-
-                Include the following information in your response:
-                - Why law: {data.get('whyLaw')}
-                - Why Jones Day: {data.get('whyJonesDay')}
-                - Why you: {data.get('whyYou')}
-                - Relevant experiences: {data.get('relevantExperiences')}
-
-                Please create a well-structured, professional application that incorporates all the provided information seamlessly.
-
-                If applicable, use the following imported draft that the user made as a reference or starting point:
-                {importedDraft}
-                """
-            else:
-                prompt = f"""
-                Generate a draft application for {firmName} addressing the following question:
-                "{question}"
-
-                Include the following information in your response:
-                - Key reason(s) for applying: {data.get('keyReasons')}
-                - Relevant experience: {data.get('relevantExperience')}
-                - Relevant interaction with the firm: {data.get('relevantInteraction')}
-                - Additional personal information: {data.get('personalInfo')}
-
-                Please create a well-structured, professional application that incorporates all the provided information seamlessly.
-
-                If applicable, use the following imported draft that the user made as a reference or starting point:
-                {importedDraft}
-                """
-
-            print(f"Using model: {model}")
-            print(f"System prompt: {system_prompt}")
-            print(f"User prompt: {prompt}")
-
-            completion = client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": prompt}
-                ]
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from _lib import metrics
+from _lib.examples import split_top_examples
+from _lib.handlers import EventStream, HTTPError, JSONRequestHandler
+from _lib.jobs import queued
+from _lib.model_router import router
+from _lib.openai_client import chat_completion
+from _lib.payloads import log_payload
+from _lib.prompt_cache import chat_messages, prompt_cache_usage
+from _lib.prompt_budget import fit_prompt
+from _lib.prompt_templates import templates
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# The prompts used to be f-strings indented 12 spaces in this file;
+# prompt_budget.tokens_saved is still reported against that layout.
+LEGACY_INDENT = ' ' * 12
+
+@queued('create_application')
+def create_application(data, headers=None):
+    log_payload(logger, "Received data", data)
+
+    firmName = data.get('firmName')
+    question = data.get('question')
+    system_prompt = data.get('system_prompt')
+    model = data.get('model')
+    importedDraft = data.get('importedDraft', '')  # Get the imported draft, default to empty string
+
+    if not all([firmName, question, system_prompt, model]):
+        raise HTTPError(400, f"Missing required data. firmName: {firmName}, question: {question}, system_prompt: {system_prompt}, model: {model}", json_body=True)
+
+    try:
+        with metrics.timed('request_stage_seconds', endpoint='/api/create_application', stage='prompt'):
+            system_prompt, examples = split_top_examples(system_prompt, importedDraft or question)
+
+            template = templates.lookup('draft', firmName, question)
+            fields = template.fields_from(data)
+
+            # The examples are sent between the system and user prompts and
+            # count against the same budget.
+            prompt, prompt_budget = fit_prompt(
+                template, fields, model, system_prompt + examples,
+                trim_first=template.trim_first,
+                baseline=template.indented(LEGACY_INDENT).format(**fields),
             )
 
-            generated_draft = completion.choices[0].message.content
-            usage = completion.usage
-
-            self.send_response(200)
-            self.set_CORS_headers()
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            response = json.dumps({
-                "success": True,
-                "draft": generated_draft,
-                "usage": {
-                    "prompt_tokens": usage.prompt_tokens,
-                    "completion_tokens": usage.completion_tokens,
-                    "total_tokens": usage.total_tokens
-                },
-                "user_prompt": prompt  # Include the user prompt in the response
-            })
-            self.wfile.write(response.encode('utf-8'))
-
-        except Exception as e:
-            print(f"Error occurred: {str(e)}")
-            self.send_error_response(500, f"Internal server error: {str(e)}")
-
-    def send_error_response(self, status_code, message):
-        self.send_response(status_code)
-        self.set_CORS_headers()
-        self.send_header('Content-type', 'application/json')
-        self.end_headers()
-        response = json.dumps({"error": message})
-        self.wfile.write(response.encode('utf-8'))
\ No newline at end of file
+        logger.info(f"Using model: {model}")
+        log_payload(logger, "System prompt", system_prompt)
+        log_payload(logger, "User prompt", prompt)
+
+        messages = chat_messages(system_prompt, prompt, examples)
+        if data.get('stream') or 'text/event-stream' in (headers or {}).get('Accept', ''):
+            return EventStream(stream_draft(model, messages, prompt, prompt_budget, firmName))
+
+        completion = router.call(
+            'create_application', model,
+            lambda candidate, max_retries: chat_completion(model=candidate, messages=messages, max_retries=max_retries),
+        )
+
+        generated_draft = completion.choices[0].message.content
+        usage = completion.usage
+
+        return 200, {
+            "success": True,
+            "draft": generated_draft,
+            "usage": {
+                "prompt_tokens": usage.prompt_tokens,
+                "completion_tokens": usage.completion_tokens,
+                "total_tokens": usage.total_tokens
+            },
+            "user_prompt": prompt,  # Include the user prompt in the response
+            "prompt_budget": prompt_budget,
+            "metadata": {"prompt_cache": prompt_cache_usage(usage, firmName), "model": completion.model}
+        }
+
+    except Exception as e:
+        print(f"Error occurred: {str(e)}")
+        raise HTTPError(500, f"Internal server error: {str(e)}", json_body=True)
+
+def stream_draft(model, messages, prompt, prompt_budget, firm=None):
+    # Pulled by the response writer only after the SSE headers are out, so the
+    # client gets its first byte before the model is called. Yields one event
+    # per token delta and a final "done" event shaped like the JSON response.
+    try:
+        # Only opening the stream is routed: a stream cannot be hedged, and
+        # its latency is time to first byte, so it is tracked separately.
+        # Returns the candidate with its stream, since a fallback may serve it.
+        served_by, stream = router.call(
+            'create_application:stream', model,
+            lambda candidate, max_retries: (candidate, chat_completion(
+                model=candidate,
+                messages=messages,
+                stream=True,
+                stream_options={"include_usage": True},
+                max_retries=max_retries,
+            )),
+            hedge=False,
+        )
+
+        parts = []
+        usage = None
+        started = time.perf_counter()
+        for chunk in stream:
+            if chunk.usage is not None:
+                usage = chunk.usage
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                parts.append(delta)
+                yield {"delta": delta}, None
+        metrics.record_usage(served_by, usage, time.perf_counter() - started)
+
+        yield {
+            "success": True,
+            "draft": "".join(parts),
+            "usage": {
+                "prompt_tokens": usage.prompt_tokens if usage else None,
+                "completion_tokens": usage.completion_tokens if usage else None,
+                "total_tokens": usage.total_tokens if usage else None
+            },
+            "user_prompt": prompt,
+            "prompt_budget": prompt_budget,
+            "metadata": {"prompt_cache": prompt_cache_usage(usage, firm), "model": served_by}
+        }, "done"
+
+    except Exception as e:
+        print(f"Error occurred while streaming: {str(e)}")
+        yield {"error": f"Internal server error: {str(e)}"}, "error"
+
+class handler(JSONRequestHandler):
+    route = staticmethod(create_application)
\ No newline at end of file
@@ -1,122 +1,83 @@
-from http.server import BaseHTTPRequestHandler, HTTPServer
-from openai import OpenAI
+import logging
 import os
-import json
-
-client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
-
-def read_prompt(filename):
-    with open(os.path.join(os.path.dirname(__file__), filename), 'r', encoding='utf-8') as file:
-        return file.read()
-
-# Read prompts
-goodwin_prompt = read_prompt('goodwin_prompt.txt')
-white_and_case_prompt = read_prompt('white_and_case_prompt.txt')
-jones_day_prompt = read_prompt('jones_day_prompt.txt')
-sidley_austin_prompt = read_prompt('sidley_austin_prompt.txt')
-dechert_prompt = read_prompt('dechert_prompt.txt')
-
-# Additional Sidley Austin specific prompts
-why_career_sidley_austin_prompt = read_prompt('why_career_sidley_austin_prompt.txt')
-commercial_issue_prompt = read_prompt('commercial_issue_prompt.txt')
-personal_qualities_prompt = read_prompt('personal_qualities_prompt.txt')
-
-class RequestHandler(BaseHTTPRequestHandler):
-    def set_CORS_headers(self):
-        self.send_header('Access-Control-Allow-Credentials', 'true')
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'GET,OPTIONS,PATCH,DELETE,POST,PUT')
-        self.send_header('Access-Control-Allow-Headers', 'X-CSRF-Token, X-Requested-With, Accept, Accept-Version, Content-Length, Content-MD5, Content-Type, Date, X-Api-Version')
-
-    def do_OPTIONS(self):
-        self.send_response(200)
-        self.set_CORS_headers()
-        self.end_headers()
-
-    def do_POST(self):
-        content_length = int(self.headers['Content-Length'])
-        post_data = self.rfile.read(content_length)
-        data = json.loads(post_data.decode('utf-8'))
-        
-        application_text = data.get('applicationText')
-        firm = data.get('firm')
-        question = data.get('question')
-        
-        if not application_text or not firm or not question:
-            self.send_error(400, "Missing required data")
-            return
-
-        if firm not in ["Goodwin", "White & Case", "Jones Day", "Sidley Austin", "Dechert"]:
-            self.send_response(200)
-            self.set_CORS_headers()
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            response = json.dumps({
-                "success": True,
-                "feedback": "Coming Soon... Only Goodwin, White & Case, Jones Day, Sidley Austin, and Dechert are active right now."
-            })
-            self.wfile.write(response.encode('utf-8'))
-            return
-
-        try:
-            if firm == "Goodwin":
-                system_prompt = goodwin_prompt
-                model = "gpt-4o"
-            elif firm == "White & Case":
-                system_prompt = white_and_case_prompt
-                model = "gpt-4o"
-            elif firm == "Jones Day":
-                system_prompt = jones_day_prompt
-                model = "gpt-4o"
-            elif firm == "Sidley Austin":
-                # Use specific prompts based on the question
-                if question == "Why does a career in commercial law and specifically Sidley Austin interest you? (250 words max)":
-                    system_prompt = why_career_sidley_austin_prompt
-                elif question == "Describe a current commercial issue that has interested you and explain why it interested you? (250 words max)":
-                    system_prompt = commercial_issue_prompt
-                elif question == "In your view which personal qualities make a successful lawyer? (250 words max)":
-                    system_prompt = personal_qualities_prompt
-                else:
-                    system_prompt = sidley_austin_prompt
-                model = "gpt-4o"
-            elif firm == "Dechert":
-                system_prompt = dechert_prompt
-                model = "gpt-4o"
-
-            user_prompt = f"""Firm: {firm}
-            Question: {question}
-            New application to be analyzed:
-
-            {application_text}"""
-            print(system_prompt)
-            completion = client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ]
-            )
-
-            ai_feedback = completion.choices[0].message.content
-
-            self.send_response(200)
-            self.set_CORS_headers()
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            response = json.dumps({
-                "success": True,
-                "feedback": ai_feedback
-            })
-            self.wfile.write(response.encode('utf-8'))
-
-        except Exception as e:
-            self.send_error(500, str(e))
-
-def run(server_class=HTTPServer, handler_class=RequestHandler, port=8000):
-    server_address = ('', port)
-    httpd = server_class(server_address, handler_class)
-    print(f'Starting httpd server on port {port}')
-    httpd.serve_forever()
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from _lib import metrics
+from _lib.examples import split_top_examples
+from _lib.handlers import HTTPError, JSONRequestHandler
+from _lib.openai_client import chat_completion
+from _lib.payloads import log_payload
+from _lib.prompt_cache import chat_messages, prompt_cache_usage
+from _lib.prompt_registry import PromptRegistry
+from _lib.prompt_templates import templates
+from _lib.single_flight import coalesced
+
+logger = logging.getLogger(__name__)
+
+# Firms, models and prompt files are listed in prompts.json and picked up on
+# change, so adding a firm is a data change rather than a code change.
+prompts = PromptRegistry(os.path.dirname(os.path.abspath(__file__)))
+prompts.preload_in_background()
+
+def active_firms_message(firms):
+    if len(firms) > 1:
+        firms = [', '.join(firms[:-1]) + ',', 'and', firms[-1]]
+    return f"Coming Soon... Only {' '.join(firms)} are active right now."
+
+@coalesced('review_application')
+def review_application(data, headers=None):
+    application_text = data.get('applicationText')
+    firm = data.get('firm')
+    question = data.get('question')
+    
+    if not application_text or not firm or not question:
+        raise HTTPError(400, "Missing required data")
+
+    try:
+        review_spec = prompts.lookup(firm, question)
+    except Exception as e:
+        raise HTTPError(500, str(e))
+
+    if review_spec is None:
+        return 200, {
+            "success": True,
+            "feedback": active_firms_message(prompts.firms())
+        }
+
+    try:
+        system_prompt, model = review_spec
+        with metrics.timed('request_stage_seconds', endpoint='/api/review_application', stage='prompt'):
+            system_prompt, examples = split_top_examples(system_prompt, application_text)
+
+        template = templates.lookup('review', firm, question)
+        user_prompt = template.format(**template.fields_from(data))
+        log_payload(logger, "System prompt", system_prompt)
+        completion = chat_completion(
+            model=model,
+            messages=chat_messages(system_prompt, user_prompt, examples)
+        )
+
+        ai_feedback = completion.choices[0].message.content
+
+        return 200, {
+            "success": True,
+            "feedback": ai_feedback,
+            "metadata": {"prompt_cache": prompt_cache_usage(completion.usage, firm)}
+        }
+
+    except Exception as e:
+        raise HTTPError(500, str(e))
+
+class RequestHandler(JSONRequestHandler):
+    route = staticmethod(review_application)
+
+def run(port=8000):
+    # Serve through the shared asyncio app server so one slow review does not
+    # block every other request the way the single-threaded HTTPServer did.
+    from _lib.app_server import serve
+    serve(port=port)
 
 if __name__ == "__main__":
-    run()
+    run()
\ No newline at end of file
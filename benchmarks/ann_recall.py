@@ -0,0 +1,88 @@
+"""Recall@k and query latency of IVF search against exact search.
+
+    python benchmarks/ann_recall.py --sizes 10000 50000 --nprobe 1 4 8 16
+    python benchmarks/ann_recall.py --index examples
+
+Without --index the corpus is synthetic: unit vectors drawn around random
+topic centres, in the 1536 dimensions text-embedding-3-small returns. With
+--index the rows of a saved VectorIndex are used, and queries are noisy
+copies of its rows.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'api'))
+
+from _lib.ivf_index import IVFIndex
+from _lib.vector_index import VectorIndex
+
+
+def synthetic_corpus(size, dim, topics, spread, rng):
+    centres = rng.normal(size=(topics, dim)).astype(np.float32)
+    vectors = centres[rng.integers(0, topics, size)] + spread * rng.normal(size=(size, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def make_queries(matrix, count, rng):
+    queries = matrix[rng.integers(0, len(matrix), count)] + 0.05 * rng.normal(size=(count, matrix.shape[1])).astype(np.float32)
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def time_queries(search, queries, k):
+    results = []
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        results.append({row_id for row_id, _, _ in search(query, k)})
+        latencies.append((time.perf_counter() - started) * 1000)
+    return results, np.percentile(latencies, 50), np.percentile(latencies, 95)
+
+
+def report(exact, queries, k, n_lists, nprobes):
+    truth, p50, p95 = time_queries(exact.search, queries, k)
+    print(f"{len(exact):>9}  {'exact':>6}  {'-':>6}  {1.0:>9.3f}  {p50:>8.3f}  {p95:>8.3f}")
+
+    started = time.perf_counter()
+    ivf = IVFIndex.build(exact, n_lists=n_lists)
+    build_seconds = time.perf_counter() - started
+    for nprobe in nprobes:
+        found, p50, p95 = time_queries(lambda query, k: ivf.search(query, k, nprobe=nprobe), queries, k)
+        recall = np.mean([len(a & b) / len(a) for a, b in zip(truth, found)])
+        print(f"{len(exact):>9}  {'ivf':>6}  {nprobe:>6}  {recall:>9.3f}  {p50:>8.3f}  {p95:>8.3f}")
+    print(f"           ({len(ivf.centroids)} lists, built in {build_seconds:.1f}s)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--index', help="Prefix of a saved VectorIndex to benchmark instead of synthetic data")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 50000])
+    parser.add_argument('--dim', type=int, default=1536)
+    parser.add_argument('--topics', type=int, default=200)
+    parser.add_argument('--spread', type=float, default=2.0, help="Noise around each topic centre; higher is harder")
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--lists', type=int, default=0, help="IVF lists; 0 uses sqrt(rows)")
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[1, 4, 8, 16, 32])
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(args.seed)
+    print(f"{'rows':>9}  {'method':>6}  {'nprobe':>6}  {f'recall@{args.k}':>9}  {'p50 ms':>8}  {'p95 ms':>8}")
+    if args.index:
+        exact = VectorIndex.load(args.index, mmap=False)
+        report(exact, make_queries(exact.matrix, args.queries, rng), args.k, args.lists or None, args.nprobe)
+        return 0
+
+    for size in args.sizes:
+        exact = VectorIndex(args.dim, capacity=size)
+        exact.add(list(range(size)), synthetic_corpus(size, args.dim, args.topics, args.spread, rng))
+        report(exact, make_queries(exact.matrix, args.queries, rng), args.k, args.lists or None, args.nprobe)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
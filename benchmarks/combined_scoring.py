@@ -0,0 +1,86 @@
+"""Tokens, calls and latency of combined vs per-section scoring.
+
+    python benchmarks/combined_scoring.py goodwin_jsonl.jsonl --model gpt-4o-mini
+
+Scores every application in the corpus both ways with the score cache off,
+and reports model calls, prompt/completion tokens and request latency per
+mode. OPENAI_BASE_URL can point it at any OpenAI-compatible server.
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'api'))
+
+from _lib import scoring
+from _lib.batch_scoring import build_score_request
+from _lib.corpus import read_jsonl
+
+# Model calls may run on scoring or model-router threads, so usage is
+# counted in one shared, locked tally rather than per thread.
+_usage = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0}
+_usage_lock = threading.Lock()
+
+
+def counting_chat_completion(chat_completion):
+    def wrapper(**kwargs):
+        response = chat_completion(**kwargs)
+        with _usage_lock:
+            _usage["calls"] += 1
+            if response.usage is not None:
+                _usage["prompt_tokens"] += response.usage.prompt_tokens
+                _usage["completion_tokens"] += response.usage.completion_tokens
+        return response
+    return wrapper
+
+
+def run_mode(requests, mode):
+    latencies = []
+    errors = 0
+    with _usage_lock:
+        before = dict(_usage)
+    for score_request in requests:
+        score_request.scoring_mode = mode
+        started = time.perf_counter()
+        results, _ = scoring.score_sections(score_request, cache=None)
+        latencies.append(time.perf_counter() - started)
+        errors += len(scoring.collect_errors(results))
+    with _usage_lock:
+        totals = {key: _usage[key] - before[key] for key in _usage}
+    totals["errors"] = errors
+    return totals, latencies
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('corpus', nargs='+')
+    parser.add_argument('--model', default='gpt-4o-mini')
+    parser.add_argument('--limit', type=int, default=0, help="Score at most this many applications")
+    args = parser.parse_args(argv)
+
+    scoring.chat_completion = counting_chat_completion(scoring.chat_completion)
+    records = [record for path in args.corpus for _, record in read_jsonl(path)]
+    if args.limit:
+        records = records[:args.limit]
+
+    print(f"{len(records)} applications, model {args.model}")
+    print(f"{'mode':>9}  {'calls':>6}  {'prompt tok':>10}  {'compl tok':>9}  {'errors':>6}  {'p50 s':>6}  {'mean s':>6}")
+    summary = {}
+    for mode in ('sections', 'combined'):
+        requests = [build_score_request(record, args.model, {}) for record in records]
+        totals, latencies = run_mode(requests, mode)
+        summary[mode] = totals
+        print(f"{mode:>9}  {totals['calls']:>6}  {totals['prompt_tokens']:>10}  {totals['completion_tokens']:>9}  "
+              f"{totals['errors']:>6}  {statistics.median(latencies):>6.2f}  {statistics.mean(latencies):>6.2f}")
+
+    saved = summary['sections']['prompt_tokens'] + summary['sections']['completion_tokens'] \
+        - summary['combined']['prompt_tokens'] - summary['combined']['completion_tokens']
+    print(f"combined mode saved {saved} tokens and {summary['sections']['calls'] - summary['combined']['calls']} calls")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
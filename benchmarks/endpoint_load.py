@@ -0,0 +1,180 @@
+"""Latency and throughput of the Python endpoints against a mock OpenAI API.
+
+    python benchmarks/endpoint_load.py goodwin_jsonl.jsonl josh.jsonl --concurrency 1 8 32 --requests 200
+    python benchmarks/endpoint_load.py josh.jsonl --url http://127.0.0.1:8000 --endpoints calculate_scores
+
+Starts benchmarks/mock_openai.py and the app server (pointed at the mock
+through OPENAI_BASE_URL) unless --url names a server that is already up,
+then replays payloads built from the corpus records at each concurrency
+level and reports p50/p95/p99 latency, requests/sec and errors per
+endpoint. No OpenAI credits are used. The score cache and request
+coalescing are off by default so repeated payloads keep hitting the model
+path; --cache leaves them on.
+"""
+import argparse
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'api'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import mock_openai
+from _lib.corpus import read_jsonl, record_messages, split_application
+
+ENDPOINTS = ('calculate_scores', 'create_application', 'submit_application')
+
+
+def payloads_for(endpoint, records, model):
+    payloads = []
+    for record in records:
+        user_messages = record_messages(record, 'user')
+        sections = split_application(user_messages[0]) if user_messages else {}
+        system_messages = record_messages(record, 'system')
+        system_prompt = system_messages[0] if system_messages else "Review this application."
+        if endpoint == 'calculate_scores':
+            payload = {}
+            for key in ('workexp', 'education', 'opentext'):
+                payload.update({f'{key}_content': sections.get(key, ''), f'{key}_model': model, f'{key}_prompt': ''})
+        elif endpoint == 'create_application':
+            payload = {
+                "firmName": "Goodwin", "question": "Why Goodwin?", "system_prompt": system_prompt, "model": model,
+                "keyReasons": sections.get('opentext', ''), "relevantExperience": sections.get('workexp', ''),
+                "relevantInteraction": "", "personalInfo": sections.get('education', ''),
+            }
+        else:
+            payload = {
+                "applicationText": sections.get('opentext', ''), "firm": "Goodwin", "question": "Why Goodwin?",
+                "work_experience": sections.get('workexp', ''), "education": sections.get('education', ''),
+                "system_prompt": system_prompt, "model": model,
+            }
+        payloads.append(json.dumps(payload).encode('utf-8'))
+    return payloads
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_app_server(base_url, cache):
+    port = free_port()
+    env = dict(os.environ, OPENAI_BASE_URL=base_url, OPENAI_API_KEY=os.environ.get('OPENAI_API_KEY', 'mock'))
+    if not cache:
+        env.update(SCORE_CACHE_DISABLED='1', SINGLE_FLIGHT_DISABLED='1')
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, 'api', '_lib', 'app_server.py'), '--host', '127.0.0.1', '--port', str(port)],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return process, f"http://127.0.0.1:{port}"
+        except OSError:
+            time.sleep(0.05)
+    process.kill()
+    raise RuntimeError("App server did not start")
+
+
+def run_level(url, endpoint, payloads, concurrency, total):
+    """Send `total` requests from `concurrency` keep-alive connections."""
+    parts = urlsplit(url)
+    path = f"/api/{endpoint}"
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    counter = iter(range(total))
+
+    def worker():
+        connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=120)
+        for i in counter:
+            body = payloads[i % len(payloads)]
+            started = time.perf_counter()
+            try:
+                connection.request('POST', path, body, {'Content-Type': 'application/json'})
+                response = connection.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException) as e:
+                connection.close()
+                connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=120)
+                status = type(e).__name__
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                if status != 200:
+                    errors.append(status)
+        connection.close()
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+    p50, p95, p99 = np.percentile(np.array(latencies) * 1000, [50, 95, 99])
+    return {"p50": p50, "p95": p95, "p99": p99, "rps": len(latencies) / wall, "errors": len(errors)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('corpus', nargs='+')
+    parser.add_argument('--url', help="Benchmark a running server instead of starting one")
+    parser.add_argument('--endpoints', nargs='+', choices=ENDPOINTS, default=list(ENDPOINTS))
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--requests', type=int, default=100, help="Requests per endpoint and concurrency level")
+    parser.add_argument('--model', default='gpt-4o-mini')
+    parser.add_argument('--cache', action='store_true', help="Leave the score cache and request coalescing on")
+    parser.add_argument('--json', help="Also write the results to this file")
+    mock_openai.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    records = [record for path in args.corpus for _, record in read_jsonl(path)]
+    if not records:
+        parser.error("no records in the corpus")
+
+    url, process = args.url, None
+    if url is None:
+        _, base_url = mock_openai.start(options=mock_openai.options_from_args(args))
+        process, url = start_app_server(base_url, args.cache)
+        print(f"Mock OpenAI at {base_url} ({args.latency:g}ms +/- {args.jitter:g}ms, "
+              f"failure rate {args.failure_rate:g}); app server at {url}")
+
+    results = []
+    try:
+        print(f"{'endpoint':>20}  {'conc':>5}  {'p50 ms':>8}  {'p95 ms':>8}  {'p99 ms':>8}  {'req/s':>7}  {'errors':>6}")
+        for endpoint in args.endpoints:
+            payloads = payloads_for(endpoint, records, args.model)
+            # Routes are imported and their clients built on first use; keep
+            # that out of the first level's numbers.
+            run_level(url, endpoint, payloads, 1, 1)
+            for concurrency in args.concurrency:
+                result = run_level(url, endpoint, payloads, concurrency, args.requests)
+                results.append(dict(result, endpoint=endpoint, concurrency=concurrency))
+                print(f"{endpoint:>20}  {concurrency:>5}  {result['p50']:>8.1f}  {result['p95']:>8.1f}  "
+                      f"{result['p99']:>8.1f}  {result['rps']:>7.1f}  {result['errors']:>6}")
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
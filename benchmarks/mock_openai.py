@@ -0,0 +1,254 @@
+"""Local stand-in for the OpenAI chat completions and embeddings API.
+
+    python benchmarks/mock_openai.py --port 8900 --latency 400 --jitter 100 --failure-rate 0.02
+    OPENAI_BASE_URL=http://127.0.0.1:8900/v1 OPENAI_API_KEY=mock python api/_lib/app_server.py
+
+Replies are canned but well-formed: score requests (response_format with a
+json_schema) get a valid score for every schema property, other chat
+requests get a short draft, and embeddings are deterministic unit vectors
+derived from the input text. stream=True is answered with SSE chunks paced
+at --tokens-per-second, ending with a usage chunk when include_usage is set.
+Usage reports a first message of 1024+ tokens that was seen before as
+cached, the way OpenAI's prompt cache does.
+A --failure-rate fraction of requests fail with --failure-status and a
+Retry-After header, so the retry path is exercised too.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import hashlib
+import json
+import random
+import sys
+import threading
+import time
+
+import numpy as np
+
+DRAFT_TEXT = (
+    "I am drawn to the firm by its market-leading transactional practice and the early responsibility "
+    "trainees are given on complex cross-border matters. My internship taught me to manage competing "
+    "deadlines while keeping a close eye on detail, and I would bring that discipline to every seat."
+)
+
+
+class MockOptions:
+    def __init__(self, latency=300.0, jitter=0.0, tokens_per_second=0.0, failure_rate=0.0,
+                 failure_status=429, retry_after=0.1, embedding_dim=1536, seed=None):
+        self.latency = latency / 1000
+        self.jitter = jitter / 1000
+        self.tokens_per_second = tokens_per_second
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+        self.retry_after = retry_after
+        self.embedding_dim = embedding_dim
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counts = {"chat": 0, "embeddings": 0, "failures": 0}
+        self.prefixes = set()
+
+    def delay(self):
+        with self.lock:
+            jitter = self.random.uniform(-self.jitter, self.jitter) if self.jitter else 0
+        return max(0.0, self.latency + jitter)
+
+    def should_fail(self):
+        with self.lock:
+            return self.failure_rate and self.random.random() < self.failure_rate
+
+
+def estimate_tokens(text):
+    return max(1, len(text) // 4)
+
+
+def score_reply(response_format):
+    schema = (response_format or {}).get('json_schema', {}).get('schema', {})
+    properties = schema.get('properties', {})
+    score = {"score": 72, "justification": "Relevant experience and a clear, specific answer."}
+    if 'score' in properties or not properties:
+        return json.dumps(score)
+    return json.dumps({key: score for key in properties})
+
+
+def embedding(text, dim):
+    seed = int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:8], 'little')
+    vector = np.random.default_rng(seed).normal(size=dim).astype(np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+class MockOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; without this, delayed ACKs
+    # add ~40ms to every keep-alive reply.
+    disable_nagle_algorithm = True
+    options = MockOptions()
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+        path = self.path.rstrip('/')
+        if path.endswith('/chat/completions'):
+            kind = 'chat'
+        elif path.endswith('/embeddings'):
+            kind = 'embeddings'
+        else:
+            self.send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "invalid_request_error"}})
+            return
+        with self.options.lock:
+            self.options.counts[kind] += 1
+
+        time.sleep(self.options.delay())
+        if self.options.should_fail():
+            with self.options.lock:
+                self.options.counts["failures"] += 1
+            self.send_json(
+                self.options.failure_status,
+                {"error": {"message": "Injected failure", "type": "mock_error"}},
+                (('Retry-After', str(self.options.retry_after)),),
+            )
+            return
+
+        if kind == 'embeddings':
+            self.send_embeddings(body)
+        elif body.get('stream'):
+            self.send_stream(body)
+        else:
+            self.send_chat(body)
+
+    def reply_text(self, body):
+        if body.get('response_format', {}).get('type') == 'json_schema' or 'JSON format' in json.dumps(body.get('messages', [])):
+            return score_reply(body.get('response_format'))
+        return DRAFT_TEXT
+
+    def cached_tokens(self, body):
+        # Like the real prompt cache: a first message of 1024+ tokens seen
+        # before is served from cache in 128-token increments.
+        messages = body.get('messages', [])
+        if not messages:
+            return 0
+        first = messages[0].get('content') or ''
+        key = hashlib.sha256(f"{body.get('model')}\0{first}".encode('utf-8')).digest()
+        with self.options.lock:
+            seen = key in self.options.prefixes
+            self.options.prefixes.add(key)
+        tokens = estimate_tokens(first)
+        return tokens // 128 * 128 if seen and tokens >= 1024 else 0
+
+    def usage(self, body, text):
+        prompt_tokens = sum(estimate_tokens(message.get('content') or '') for message in body.get('messages', []))
+        completion_tokens = estimate_tokens(text)
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": self.cached_tokens(body)},
+        }
+
+    def send_chat(self, body):
+        text = self.reply_text(body)
+        self.send_json(200, {
+            "id": "chatcmpl-mock",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get('model', 'mock'),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": self.usage(body, text),
+        })
+
+    def send_stream(self, body):
+        text = self.reply_text(body)
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+
+        def chunk(choices, usage=None):
+            payload = {"id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": int(time.time()),
+                       "model": body.get('model', 'mock'), "choices": choices, "usage": usage}
+            self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+
+        words = text.split(' ')
+        for i, word in enumerate(words):
+            chunk([{"index": 0, "delta": {"content": word if i == 0 else ' ' + word}, "finish_reason": None}])
+            if self.options.tokens_per_second:
+                time.sleep(1 / self.options.tokens_per_second)
+        chunk([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+        if body.get('stream_options', {}).get('include_usage'):
+            chunk([], self.usage(body, text))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        self.close_connection = True
+
+    def send_embeddings(self, body):
+        inputs = body.get('input', [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        prompt_tokens = sum(estimate_tokens(text) for text in inputs)
+        self.send_json(200, {
+            "object": "list",
+            "model": body.get('model', 'mock'),
+            "data": [
+                {"object": "embedding", "index": i, "embedding": embedding(text, self.options.embedding_dim)}
+                for i, text in enumerate(inputs)
+            ],
+            "usage": {"prompt_tokens": prompt_tokens, "total_tokens": prompt_tokens},
+        })
+
+    def send_json(self, status, payload, extra_headers=()):
+        content = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        for name, value in extra_headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+
+def start(host='127.0.0.1', port=0, options=None):
+    """Serve the mock on a daemon thread; returns (server, base_url)."""
+    handler = type('Handler', (MockOpenAIHandler,), {'options': options or MockOptions()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='mock-openai', daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+def add_arguments(parser):
+    parser.add_argument('--latency', type=float, default=300, help="Milliseconds before each reply starts")
+    parser.add_argument('--jitter', type=float, default=0, help="Uniform +/- milliseconds added to --latency")
+    parser.add_argument('--tokens-per-second', type=float, default=0, help="Pace of streamed chunks (0 = unpaced)")
+    parser.add_argument('--failure-rate', type=float, default=0, help="Fraction of requests that fail")
+    parser.add_argument('--failure-status', type=int, default=429)
+    parser.add_argument('--retry-after', type=float, default=0.1, help="Retry-After seconds on injected failures")
+    parser.add_argument('--seed', type=int, default=None)
+
+
+def options_from_args(args):
+    return MockOptions(
+        latency=args.latency, jitter=args.jitter, tokens_per_second=args.tokens_per_second,
+        failure_rate=args.failure_rate, failure_status=args.failure_status,
+        retry_after=args.retry_after, seed=args.seed,
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    server, base_url = start(args.host, args.port, options_from_args(args))
+    print(f"Mock OpenAI API at {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
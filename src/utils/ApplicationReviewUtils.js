@@ -243,7 +243,7 @@ export const calculateAndUpdateScores = async (userId, firmId) => {
   try {
     const { data: firmData, error: firmError } = await supabase
       .from('firms')
-      .select('workexp_model, workexp_prompt, opentext_model, opentext_prompt, education_model, education_prompt, id')
+      .select('workexp_model, workexp_prompt, opentext_model, opentext_prompt, education_model, education_prompt, id, name')
       .eq('id', firmId)
       .single();
 
@@ -296,7 +296,9 @@ export const calculateAndUpdateScores = async (userId, firmId) => {
         opentext_prompt: firmData.opentext_prompt || '',
         education_content: educationContent,
         education_model: firmData.education_model || 'gpt-4o-mini',
-        education_prompt: firmData.education_prompt || ''
+        education_prompt: firmData.education_prompt || '',
+        firm_id: firmId,
+        firm: firmData.name
       }),
     });
 